@@ -0,0 +1,137 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+def region_signature(frame, region_bounds, size=16):
+    """把每个区域缩小为 size×size 的灰度图，返回 (区域数, size, size) 的 float32 数组，用于廉价的帧差比较"""
+    h, w = frame.shape[:2]
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    patches = []
+    for x_min, x_max, y_min, y_max in region_bounds:
+        x1, x2 = int(x_min * w), max(int(x_max * w), int(x_min * w) + 1)
+        y1, y2 = int(y_min * h), max(int(y_max * h), int(y_min * h) + 1)
+        patches.append(cv2.resize(gray[y1:y2, x1:x2], (size, size), interpolation=cv2.INTER_AREA))
+    return np.stack(patches).astype(np.float32)
+
+
+def region_difference(sig_a, sig_b):
+    """两帧区域签名的差异：各区域平均绝对差（0~255）中的最大值"""
+    return float(np.abs(sig_a - sig_b).mean(axis=(1, 2)).max())
+
+
+class AdaptiveScheduler:
+    """自适应拍摄调度：结果收敛后降低推理频率直至暂停，区域帧差检测到场景变化时立即恢复全速
+
+    状态：
+        fast   - 全速推理，间隔 fast_interval
+        slow   - 连续 stable_after 次结果相同，每 slow_interval 秒推理一次
+        paused - 连续 pause_after 次结果相同，只做帧差检测，每 recheck_interval 秒确认一次
+    非 fast 状态下每 check_interval 秒取一帧做帧差检测，开销只有几次小图缩放
+    """
+
+    def __init__(self, region_bounds, fast_interval=0.0, slow_interval=2.0, recheck_interval=8.0,
+                 stable_after=5, pause_after=20, change_threshold=12.0, check_interval=0.2, on_change=None):
+        self.region_bounds = region_bounds
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.recheck_interval = recheck_interval
+        self.stable_after = stable_after
+        self.pause_after = pause_after
+        self.change_threshold = change_threshold
+        self.check_interval = check_interval
+        self.on_change = on_change  # 检测到场景变化时的回调，如清空时间融合历史
+
+        self.state = 'fast'
+        self.same_count = 0
+        self.skipped = 0  # 因结果收敛而跳过推理的帧数
+        self._last_result = None
+        self._reference = None  # 上一次推理帧的区域签名
+        self._last_infer = 0.0
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        if state != self.state:
+            print(f"调度状态: {self.state} -> {state}")
+            self.state = state
+
+    def observe_result(self, result):
+        """主循环每得到一个结果调用一次，根据连续相同结果的次数调整状态"""
+        with self._lock:
+            self.same_count = self.same_count + 1 if result == self._last_result else 0
+            self._last_result = result
+            if self.same_count >= self.pause_after:
+                self._set_state('paused')
+            elif self.same_count >= self.stable_after:
+                self._set_state('slow')
+            else:
+                self._set_state('fast')
+
+    def should_infer(self, frame):
+        """拍照阶段每取一帧调用一次，返回该帧是否需要送去推理"""
+        signature = region_signature(frame, self.region_bounds)
+        now = time.monotonic()
+        with self._lock:
+            changed = (self._reference is not None
+                       and region_difference(signature, self._reference) > self.change_threshold)
+            if changed:
+                print("检测到场景变化，恢复全速推理")
+                self.same_count = 0
+                self._last_result = None
+                self._set_state('fast')
+            elif self.state != 'fast':
+                period = self.slow_interval if self.state == 'slow' else self.recheck_interval
+                if now - self._last_infer < period:
+                    self.skipped += 1
+                    return False
+
+            self._reference = signature
+            self._last_infer = now
+
+        if changed and self.on_change is not None:
+            self.on_change()
+        return True
+
+    def interval(self):
+        """拍照阶段两次取帧之间的间隔"""
+        return self.fast_interval if self.state == 'fast' else self.check_interval
+
+
+class SceneChangeGate:
+    """场景变化门限：与上一次推理帧的区域签名相比差异低于 threshold 时判定画面未变，直接复用上一次结果
+
+    max_reuse 限制连续复用的帧数，防止光照缓慢漂移等累积变化一直被忽略；
+    参考帧的推理失败时由推理阶段调用 reset()，避免后续未变的帧复用一个不存在的结果
+    """
+
+    def __init__(self, region_bounds, threshold=4.0, max_reuse=30):
+        self.region_bounds = region_bounds
+        self.threshold = threshold
+        self.max_reuse = max_reuse
+        self.checked = 0  # 检查过的帧数
+        self.skipped = 0  # 因画面未变而跳过推理的帧数
+        self._reference = None  # 上一次推理帧的区域签名
+        self._reused = 0  # 当前连续复用的帧数
+        self._lock = threading.Lock()  # changed() 在拍照阶段调用，reset() 在推理阶段调用
+
+    def changed(self, frame):
+        """返回该帧是否需要推理；返回 False 时调用方应复用上一次的结果"""
+        signature = region_signature(frame, self.region_bounds)
+        with self._lock:
+            self.checked += 1
+            if (self._reference is not None and self._reused < self.max_reuse
+                    and region_difference(signature, self._reference) <= self.threshold):
+                self._reused += 1
+                self.skipped += 1
+                return False
+            self._reference = signature
+            self._reused = 0
+            return True
+
+    def reset(self):
+        """丢弃参考帧，下一帧必定推理"""
+        with self._lock:
+            self._reference = None
+            self._reused = 0
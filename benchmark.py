@@ -0,0 +1,209 @@
+import argparse
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from export_model import load_val_frames
+from task_profile import load_profile
+
+
+def load_truth(path):
+    """读取真值文件：每行 `<图片文件名> <结果字符串>`，返回 {文件名: 字符串}"""
+    truth = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2:
+                truth[parts[0]] = parts[1]
+    return truth
+
+
+def make_runner(profile, detector, names, roi, roi_pad=None):
+    """返回单帧处理函数 run(frame, tracker)：变焦 → 预处理 → 推理 → 区域划分 → 去重补全，与主程序流水线的处理相同
+
+    变焦、区域划分与解码使用主程序加载的同一个任务配置（task_profile.py），各环节耗时记入 tracker
+    """
+    def run(frame, tracker):
+        with tracker.timer('zoom'):
+            zoom_frame = profile.zoom(frame)
+        try:
+            if roi:
+                det = detector.detect_rois(zoom_frame, profile.region_bounds, pad=roi_pad, union=roi == 'union')
+            else:
+                with tracker.timer('preprocess'):
+                    im = detector.preprocess(zoom_frame)
+                det = detector.forward(im, zoom_frame.shape)
+        except Exception:
+            # 与主程序相同：配置了 empty_result（纸垛为 "error"）时输出该结果，否则丢弃该帧
+            if profile.empty_result is None:
+                raise
+            return profile.empty_result
+        tracker.record('inference', detector.dt[1].dt)
+        tracker.record('nms', detector.dt[2].dt)
+        return profile.parse(det, names, (zoom_frame.shape[1], zoom_frame.shape[0]), tracker=tracker)[0]
+    return run
+
+
+def run_config(config, frames_dir, truth_path, yolov5_dir, weights, repeat=1, warmup=3):
+    """在当前进程中按一组配置回放整个目录的帧，返回结果字典（由子进程调用，保证内存峰值、线程数互不影响）"""
+    task = config['task']
+    if config['threads']:
+        import torch
+        torch.set_num_threads(config['threads'])
+
+    # 本仓库的 box_detect.py / stack_detect.py 部署为 yolov5-master/detect.py
+    sys.path.insert(0, yolov5_dir)
+    from detect import Detector
+    if task == 'box':
+        import box_main as task_main
+    else:
+        import stack_main as task_main
+    from metrics import LatencyTracker
+
+    frames = load_val_frames(frames_dir)
+    if not frames:
+        raise RuntimeError(f"目录中没有图片: {frames_dir}")
+    truth = load_truth(truth_path) if truth_path else {}
+
+    imgsz = config['imgsz']
+    detector = Detector(weights=weights, imgsz=(imgsz, imgsz), backend=config['backend'], device='cpu')
+    profile = load_profile(task)
+    profile.zoom_mode = config.get('zoom', profile.zoom_mode)
+    roi_pad = task_main.ROI_PAD if config['roi'] else None  # 只有纸垛有 ROI 模式
+    run = make_runner(profile, detector, task_main.load_class_names(yolov5_dir), config['roi'], roi_pad)
+
+    for _, frame in frames[:warmup]:
+        run(frame, LatencyTracker())
+
+    # 预热帧的耗时记入单独的统计对象，只统计正式回放部分
+    tracker = LatencyTracker(window=len(frames) * repeat)
+    latencies, correct, labelled = [], 0, 0
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        for name, frame in frames:
+            t0 = time.perf_counter()
+            result = run(frame, tracker)
+            latencies.append(time.perf_counter() - t0)
+            if name in truth:
+                labelled += 1
+                correct += result == truth[name]
+    elapsed = time.perf_counter() - t_start
+
+    latencies = np.array(latencies) * 1e3
+    return {
+        **config,
+        'weights': str(detector.weights),
+        'frames': len(latencies),
+        'fps': round(len(latencies) / elapsed, 2),
+        'latency_ms': {
+            'p50': round(float(np.percentile(latencies, 50)), 2),
+            'p95': round(float(np.percentile(latencies, 95)), 2),
+            'p99': round(float(np.percentile(latencies, 99)), 2),
+            'max': round(float(latencies.max()), 2),
+        },
+        'stages_ms': tracker.percentiles(),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'labelled': labelled,
+        'agreement': round(correct / labelled, 4) if labelled else None,
+    }
+
+
+def sweep(opt):
+    """枚举所有配置组合，每个组合在独立子进程中运行，返回结果列表"""
+    profile = load_profile(opt.task)
+    rois = [None if roi == 'none' else roi for roi in opt.roi] if opt.task == 'stack' else [None]  # 货箱没有 ROI 模式
+
+    def default_imgsz(roi):
+        # 未指定 --imgsz 时与主程序一致：整帧用任务配置的尺寸，ROI 模式用 stack_main.ROI_IMGSZ
+        if roi is None:
+            return profile.imgsz
+        from stack_main import ROI_IMGSZ
+        return ROI_IMGSZ[roi]
+
+    configs = [
+        {'task': opt.task, 'backend': backend, 'imgsz': imgsz or default_imgsz(roi), 'threads': threads, 'roi': roi,
+         'zoom': zoom}
+        for backend, imgsz, threads, roi, zoom in itertools.product(
+            opt.backend, opt.imgsz or [None], opt.threads, rois, opt.zoom_mode
+        )
+    ]
+
+    results = []
+    for config in configs:
+        print(f"运行配置: {config}", file=sys.stderr)
+        cmd = [
+            sys.executable, os.path.abspath(__file__), '--task', opt.task, '--frames-dir', opt.frames_dir,
+            '--repeat', str(opt.repeat), '--warmup', str(opt.warmup), '--config', json.dumps(config),
+        ]
+        for flag, value in (('--truth', opt.truth), ('--weights', opt.weights), ('--yolov5-dir', opt.yolov5_dir)):
+            if value:
+                cmd += [flag, value]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode == 0 and lines:
+            results.append(json.loads(lines[-1]))
+        else:
+            # 例如所选后端的导出模型不存在、导出模型的输入尺寸与 imgsz 不一致
+            error = (proc.stderr.strip().splitlines() or ["未知错误"])[-1]
+            results.append({**config, 'error': error})
+        print(json.dumps(results[-1], ensure_ascii=False), file=sys.stderr)
+    return results
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="用录制的帧离线回放货箱/纸垛识别流程，对比不同后端、尺寸、线程数、ROI 模式、变焦模式的速度与准确率")
+    parser.add_argument('--task', choices=['box', 'stack'], required=True,
+                        help="box 或 stack，默认的目录、权重与尺寸取自同名任务配置")
+    parser.add_argument('--frames-dir', required=True, help="录制的 1280×720 帧所在目录")
+    parser.add_argument('--truth', default=None, help="真值文件，每行 `<图片文件名> <结果字符串>`；默认使用帧目录下的 truth.txt（若存在）")
+    parser.add_argument('--weights', default=None, help="PyTorch 权重路径，默认使用任务配置中的权重")
+    parser.add_argument('--yolov5-dir', default=None, help="yolov5-master 目录，默认使用任务配置中的目录")
+    parser.add_argument('--backend', nargs='+', default=['pt'],
+                        choices=['pt', 'onnx', 'int8', 'openvino', 'torchscript'], help="要对比的推理后端")
+    parser.add_argument('--imgsz', nargs='+', type=int, default=None,
+                        help="要对比的推理尺寸，默认整帧使用任务配置的尺寸、ROI 模式使用 stack_main.ROI_IMGSZ")
+    parser.add_argument('--threads', nargs='+', type=int, default=[0], help="要对比的 PyTorch 线程数，0 为不设置")
+    parser.add_argument('--roi', nargs='+', default=['none'], choices=['none', 'each', 'union'],
+                        help="要对比的 ROI 模式（仅纸垛）")
+    parser.add_argument('--zoom-mode', nargs='+', default=['resize'], choices=['resize', 'crop'],
+                        help="要对比的数码变焦模式：resize 为放大回原尺寸，crop 为裁剪图直接送入 letterbox")
+    parser.add_argument('--repeat', type=int, default=1, help="整个目录回放的次数")
+    parser.add_argument('--warmup', type=int, default=3, help="不计入统计的预热帧数")
+    parser.add_argument('--output', default=None, help="JSON 结果输出路径，默认打印到标准输出")
+    parser.add_argument('--config', default=None, help=argparse.SUPPRESS)  # 子进程运行单个配置
+    return parser.parse_args()
+
+
+def main(opt):
+    profile = load_profile(opt.task)
+    truth = opt.truth
+    if truth is None and os.path.exists(os.path.join(opt.frames_dir, 'truth.txt')):
+        truth = os.path.join(opt.frames_dir, 'truth.txt')
+
+    if opt.config:
+        result = run_config(
+            json.loads(opt.config), opt.frames_dir, truth, opt.yolov5_dir or profile.yolov5_dir,
+            opt.weights or profile.weights, opt.repeat, opt.warmup,
+        )
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    opt.truth = truth
+    report = {'task': opt.task, 'frames_dir': opt.frames_dir, 'truth': truth, 'results': sweep(opt)}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if opt.output:
+        with open(opt.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"结果已保存到 {opt.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main(parse_opt())
@@ -35,6 +35,7 @@ import platform
 import sys
 from pathlib import Path
 
+import numpy as np
 import torch
 
 FILE = Path(__file__).resolve()
@@ -46,6 +47,7 @@ ROOT = Path(os.path.relpath(ROOT, Path.cwd()))  # relative
 from ultralytics.utils.plotting import Annotator, colors, save_one_box
 
 from models.common import DetectMultiBackend
+from utils.augmentations import letterbox
 from utils.dataloaders import IMG_FORMATS, VID_FORMATS, LoadImages, LoadScreenshots, LoadStreams
 from utils.general import (
     LOGGER,
@@ -61,6 +63,7 @@ from utils.general import (
     print_args,
     scale_boxes,
     strip_optimizer,
+    xywhn2xyxy,
     xyxy2xywh,
 )
 from utils.torch_utils import select_device, smart_inference_mode
@@ -321,6 +324,349 @@ def run(
         strip_optimizer(weights[0])  # update model (to fix SourceChangeWarning)
 
 
+# CPU backends tried by select_weights(backend="auto"), in order
+EXPORT_BACKENDS = ("int8", "onnx", "openvino", "torchscript")
+VERIFIED_SUFFIX = ".verified.json"  # marker written next to an exported model once it matches PyTorch
+
+
+def export_path(weights, backend):
+    """
+    Returns the path YOLOv5 `export.py` writes for a given backend, next to the PyTorch weights.
+
+    Args:
+        weights (str | Path): Path to the PyTorch '.pt' weights.
+        backend (str): Export backend, one of `EXPORT_BACKENDS`.
+
+    Returns:
+        (Path): '<stem>.onnx' for ONNX Runtime, '<stem>_int8.onnx' for the INT8 model produced by
+            `quantize_model.py`, the '<stem>_openvino_model' directory for OpenVINO, or '<stem>.torchscript' for the
+            TorchScript snapshot, which loads without rebuilding and fusing the PyTorch model.
+    """
+    weights = Path(weights)
+    if backend == "onnx":
+        return weights.with_suffix(".onnx")
+    if backend == "int8":
+        return weights.parent / f"{weights.stem}_int8.onnx"
+    if backend == "openvino":
+        return weights.parent / f"{weights.stem}_openvino_model"
+    if backend == "torchscript":
+        return weights.with_suffix(".torchscript")
+    raise ValueError(f"unsupported export backend '{backend}', expected one of {EXPORT_BACKENDS}")
+
+
+def select_weights(weights, backend="auto"):
+    """
+    Selects the model file for the requested runtime backend.
+
+    Args:
+        weights (str | Path): Path to the PyTorch '.pt' weights the exported models were derived from.
+        backend (str): 'pt' for PyTorch, 'onnx', 'int8', 'openvino' or 'torchscript' for the exported model, or 'auto'
+            to use the first exported model in `EXPORT_BACKENDS` that passed the checks of `export_model.py` or
+            `quantize_model.py`, falling back to PyTorch. Default is 'auto'.
+
+    Returns:
+        (Path): Path to pass to `DetectMultiBackend`.
+    """
+    weights = Path(weights)
+    if backend == "pt" or weights.suffix != ".pt":
+        return weights
+    if backend == "auto":
+        for b in EXPORT_BACKENDS:
+            f = export_path(weights, b)
+            if f.exists() and Path(f"{f}{VERIFIED_SUFFIX}").exists():
+                return f
+        return weights
+    f = export_path(weights, backend)
+    if not f.exists():
+        script = "quantize_model.py" if backend == "int8" else f"export_model.py --backend {backend}"
+        raise FileNotFoundError(f"{f} not found, export it first with {script}")
+    return f
+
+
+def write_labels(det, txt_path, save_conf=True, mode="a"):
+    """
+    Writes detections returned by `Detector` to a YOLO-format label file, matching the `--save-txt` output of `run`.
+
+    Args:
+        det (np.ndarray): Detections of shape (N, 6) as normalized xywh, confidence and class.
+        txt_path (str | Path): Label file path, including the '.txt' suffix.
+        save_conf (bool): If True, append the confidence column as `--save-conf` does. Default is True.
+        mode (str): File open mode; 'a' appends like `run`, 'w' overwrites the file in place. Default is 'a'.
+
+    Returns:
+        None
+    """
+    with open(txt_path, mode) as f:
+        for *xywh, conf, cls in det.tolist():
+            line = (cls, *xywh, conf) if save_conf else (cls, *xywh)  # label format
+            f.write(("%g " * len(line)).rstrip() % line + "\n")
+
+
+class Detector:
+    """
+    Persistent YOLOv5 detector that loads the weights once and runs inference on in-memory BGR frames.
+
+    `run` rebuilds `DetectMultiBackend` and warms it up on every call, which dominates the cycle time when it is
+    launched once per frame. `Detector` keeps the model resident and reuses the same preprocessing, NMS and box
+    rescaling steps, so a caller can feed frames from `cv2.VideoCapture` directly.
+
+    Args:
+        weights (str | Path): Path to the model weights file. Defaults to the `--weights` default of `parse_opt`.
+        data (str | Path): Path to the dataset YAML file. Default is 'data/coco128.yaml'.
+        imgsz (tuple[int, int]): Inference image size as a tuple (height, width). Defaults to the `--imgsz` default of
+            `parse_opt`.
+        conf_thres (float): Confidence threshold for detections. Default is 0.25.
+        iou_thres (float): Intersection Over Union (IOU) threshold for non-max suppression. Default is 0.45.
+        max_det (int): Maximum number of detections per image. Default is 1000.
+        device (str): CUDA device identifier (e.g., '0' or '0,1,2,3') or 'cpu'. Default is an empty string.
+        backend (str): Runtime backend passed to `select_weights`: 'pt', 'onnx', 'int8', 'openvino', 'torchscript'
+            or 'auto'. Default is 'auto', which uses a verified INT8 / ONNX Runtime / OpenVINO / TorchScript export
+            when one is present next to `weights`.
+        classes (list[int]): List of class indices to filter detections by. Default is None.
+        agnostic_nms (bool): If True, perform class-agnostic NMS. Default is True, matching the `--agnostic-nms` CLI
+            default of `parse_opt`.
+        half (bool): If True, use FP16 half-precision inference. Default is False.
+        dnn (bool): If True, use OpenCV DNN backend for ONNX inference. Default is False.
+
+    Examples:
+        ```python
+        detector = Detector()
+        ret, frame = cap.read()
+        det = detector(frame)  # (N, 6) array of normalized xywh, conf, cls
+        ```
+    """
+
+    def __init__(
+        self,
+        weights=ROOT / "/home/pi/yolo_outcome/exp14/best.pt",
+        data=ROOT / "data/coco128.yaml",
+        imgsz=(640, 640),
+        conf_thres=0.25,
+        iou_thres=0.45,
+        max_det=1000,
+        device="",
+        backend="auto",
+        classes=None,
+        agnostic_nms=True,
+        half=False,
+        dnn=False,
+    ):
+        """Loads the model once and warms it up at the configured inference size."""
+        self.device = select_device(device)
+        self.weights = select_weights(weights, backend)
+        LOGGER.info(f"Detector using {self.weights}")
+        self.model = DetectMultiBackend(self.weights, device=self.device, dnn=dnn, data=data, fp16=half)
+        self.stride, self.names, self.pt = self.model.stride, self.model.names, self.model.pt
+        self.imgsz = check_img_size(imgsz, s=self.stride)  # check image size
+        self.conf_thres, self.iou_thres, self.max_det = conf_thres, iou_thres, max_det
+        self.classes, self.agnostic_nms = classes, agnostic_nms
+        self.model.warmup(imgsz=(1, 3, *self.imgsz))  # warmup
+        self.dt = (Profile(device=self.device), Profile(device=self.device), Profile(device=self.device))
+
+    def __call__(self, im0):
+        """
+        Runs detection on a single BGR frame.
+
+        Args:
+            im0 (np.ndarray): BGR image of shape (H, W, 3), as returned by `cv2.VideoCapture.read`.
+
+        Returns:
+            (np.ndarray): Detections of shape (N, 6) as normalized xywh, confidence and class, in the same row order
+                that `run` writes to its label files.
+        """
+        return self.forward(self.preprocess(im0), im0.shape)
+
+    def preprocess(self, im0, auto=None, scaleup=True):
+        """
+        Letterboxes a BGR frame into a normalized model input tensor.
+
+        Split from `forward` so a pipelined caller can prepare frame N+1 while frame N is in inference.
+
+        Args:
+            im0 (np.ndarray): BGR image of shape (H, W, 3).
+            auto (bool, optional): Pad to the minimum stride-multiple rectangle instead of the full `imgsz`. Default is
+                None, which does so for PyTorch models only.
+            scaleup (bool): Allow upscaling images smaller than `imgsz`. Default is True.
+
+        Returns:
+            (torch.Tensor): Input tensor of shape (1, 3, h, w) on the model device.
+        """
+        return self._letterbox(im0, auto, scaleup)[0]
+
+    def _letterbox(self, im0, auto=None, scaleup=True):
+        """Returns the input tensor of `preprocess` together with the letterbox (ratio, pad) used to build it."""
+        auto = self.pt if auto is None else auto
+        with self.dt[0]:
+            im, ratio, pad = letterbox(im0, self.imgsz, stride=self.stride, auto=auto, scaleup=scaleup)  # padded resize
+            im = np.ascontiguousarray(im.transpose((2, 0, 1))[::-1])  # HWC to CHW, BGR to RGB
+            im = torch.from_numpy(im).to(self.model.device)
+            im = im.half() if self.model.fp16 else im.float()  # uint8 to fp16/32
+            im /= 255  # 0 - 255 to 0.0 - 1.0
+            return im[None], (ratio, pad)  # expand for batch dim
+
+    @smart_inference_mode()
+    def forward(self, im, shape):
+        """
+        Runs inference and NMS on a tensor from `preprocess` and rescales boxes to the original frame.
+
+        Args:
+            im (torch.Tensor): Input tensor returned by `preprocess`.
+            shape (tuple[int, ...]): Shape of the original frame, i.e. `im0.shape`.
+
+        Returns:
+            (np.ndarray): Detections of shape (N, 6) as normalized xywh, confidence and class, in the same row order
+                that `run` writes to its label files.
+        """
+        # Inference
+        with self.dt[1]:
+            pred = self.model(im)
+
+        # NMS
+        with self.dt[2]:
+            pred = non_max_suppression(
+                pred, self.conf_thres, self.iou_thres, self.classes, self.agnostic_nms, max_det=self.max_det
+            )
+
+        det = pred[0]
+        if not len(det):
+            return np.zeros((0, 6), dtype=np.float32)
+        det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], shape).round()
+        gn = torch.tensor(shape, device=det.device)[[1, 0, 1, 0]]  # normalization gain whwh
+        det = torch.cat((xyxy2xywh(det[:, :4]) / gn, det[:, 4:6]), 1)  # normalized xywh, conf, cls
+        return det.flip(0).cpu().numpy()  # reversed, as written by run
+
+    @staticmethod
+    def roi_boxes(shape, rois, pad=0.02, union=False):
+        """
+        Converts normalized regions of interest to clipped pixel crop boxes.
+
+        Args:
+            shape (tuple[int, ...]): Shape of the frame, i.e. `im0.shape`.
+            rois (list[tuple[float, float, float, float]]): Regions as (x_min, x_max, y_min, y_max) ratios, the
+                `region_bounds` format of the main scripts.
+            pad (float): Normalized margin added around every region. Default is 0.02.
+            union (bool): If True, return a single box covering all regions. Default is False.
+
+        Returns:
+            (list[tuple[int, int, int, int]]): Pixel boxes as (x1, y1, x2, y2).
+        """
+        h, w = shape[:2]
+        if union:
+            x_mins, x_maxs, y_mins, y_maxs = zip(*rois)
+            rois = [(min(x_mins), max(x_maxs), min(y_mins), max(y_maxs))]
+        boxes = []
+        for x_min, x_max, y_min, y_max in rois:
+            x1, y1 = max(int((x_min - pad) * w), 0), max(int((y_min - pad) * h), 0)
+            x2, y2 = min(int(np.ceil((x_max + pad) * w)), w), min(int(np.ceil((y_max + pad) * h)), h)
+            boxes.append((x1, y1, x2, y2))
+        return boxes
+
+    @smart_inference_mode()
+    def detect_rois(self, im0, rois, pad=0.02, union=False):
+        """
+        Runs detection only on regions of interest and maps the boxes back to normalized full-frame coordinates.
+
+        Crops are letterboxed without upscaling, so objects keep the scale the model was trained at while far fewer
+        pixels are processed than for a full `imgsz` frame. Size `imgsz` to the largest crop: about 256 for the
+        individual stack regions, or the full size for `union`. PyTorch models run all crops as one batch; exported
+        models with a fixed batch size run them one at a time. Exported models also have a fixed input size, so they
+        only work here when `imgsz` equals the size they were exported at; use the '.pt' weights for smaller crops.
+
+        Args:
+            im0 (np.ndarray): BGR image of shape (H, W, 3).
+            rois (list[tuple[float, float, float, float]]): Regions as (x_min, x_max, y_min, y_max) ratios.
+            pad (float): Normalized margin added around every region. Default is 0.02.
+            union (bool): If True, run a single crop covering all regions instead of one crop per region. Default is
+                False.
+
+        Returns:
+            (np.ndarray): Detections of shape (N, 6) as full-frame normalized xywh, confidence and class.
+        """
+        h, w = im0.shape[:2]
+        boxes = self.roi_boxes(im0.shape, rois, pad, union)
+        crops = [im0[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+        ims, ratio_pads = zip(*(self._letterbox(crop, auto=False, scaleup=False) for crop in crops))  # same shapes
+
+        # Inference
+        with self.dt[1]:
+            if self.pt and len(ims) > 1:
+                preds = [self.model(torch.cat(ims, 0))]
+            else:
+                preds = [self.model(im) for im in ims]
+
+        # NMS
+        with self.dt[2]:
+            pred = []
+            for p in preds:
+                pred.extend(
+                    non_max_suppression(
+                        p, self.conf_thres, self.iou_thres, self.classes, self.agnostic_nms, max_det=self.max_det
+                    )
+                )
+
+        dets = []
+        gn = torch.tensor((w, h, w, h), device=self.model.device)  # normalization gain whwh
+        for det, crop, ratio_pad, (x1, y1, _, _) in zip(pred, crops, ratio_pads, boxes):
+            if not len(det):
+                continue
+            det[:, :4] = scale_boxes(ims[0].shape[2:], det[:, :4], crop.shape, ratio_pad).round()
+            det[:, [0, 2]] += x1  # crop to frame offset
+            det[:, [1, 3]] += y1
+            dets.append(torch.cat((xyxy2xywh(det[:, :4]) / gn, det[:, 4:6]), 1).flip(0))
+        if not dets:
+            return np.zeros((0, 6), dtype=np.float32)
+        return torch.cat(dets, 0).cpu().numpy()
+
+
+class DebugSink:
+    """
+    Optional disk sink for `Detector` results, reproducing the saved image and `--save-txt --save-conf` labels of `run`.
+
+    The in-memory `Detector` path never touches the disk; attach a `DebugSink` only when the frames and labels need
+    to be inspected afterwards. The sink works in a fixed workspace: directories are created once and files are
+    overwritten in place, cycling through `slots` ring-buffer entries, so nothing is deleted while the loop runs.
+
+    Args:
+        save_dir (str | Path): Directory receiving '<name>.jpg' and 'labels/<name>.txt'.
+        names (list[str] | dict[int, str], optional): Class names used to annotate the saved image. Default is None,
+            which saves the raw frame.
+        line_thickness (int): Thickness of bounding box lines in pixels. Default is 3.
+        slots (int): Number of ring-buffer slots. With 1 slot every frame overwrites '<name>.jpg'; with more slots
+            frames are written to '<name>_0.jpg' ... '<name>_{slots-1}.jpg' in turn. Default is 1.
+
+    Examples:
+        ```python
+        sink = DebugSink("runs/detect/debug", names=detector.names, slots=8)
+        sink(frame, detector(frame))
+        ```
+    """
+
+    def __init__(self, save_dir, names=None, line_thickness=3, slots=1):
+        """Creates the workspace directories once and stores the annotation settings."""
+        self.save_dir = Path(save_dir)
+        (self.save_dir / "labels").mkdir(parents=True, exist_ok=True)
+        self.names = names
+        self.line_thickness = line_thickness
+        self.slots = max(int(slots), 1)
+        self.count = 0
+
+    def __call__(self, im0, det, name="temp"):
+        """Overwrites the current slot with the frame and its detections and returns the file stem used."""
+        stem = name if self.slots == 1 else f"{name}_{self.count % self.slots}"
+        self.count += 1
+        write_labels(det, self.save_dir / "labels" / f"{stem}.txt", mode="w")  # empty file means no detections
+        if self.names is not None:
+            im0 = im0.copy()
+            annotator = Annotator(im0, line_width=self.line_thickness, example=str(self.names))
+            h, w = im0.shape[:2]
+            for xyxy, conf, cls in zip(xywhn2xyxy(det[:, :4], w, h), det[:, 4], det[:, 5]):
+                c = int(cls)  # integer class
+                annotator.box_label(xyxy, f"{self.names[c]} {conf:.2f}", color=colors(c, True))
+            im0 = annotator.result()
+        cv2.imwrite(str(self.save_dir / f"{stem}.jpg"), im0)
+        return stem
+
+
 def parse_opt():
     """
     Parse command-line arguments for YOLOv5 detection, allowing custom inference options and model configurations.
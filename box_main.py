@@ -1,253 +1,176 @@
+import argparse
 import cv2
-import time
 import os
-import subprocess
-import yaml
+import sys
 import shutil
-import serial
-import threading
 from glob import glob
 
+from adaptive_scheduler import AdaptiveScheduler, SceneChangeGate
+from cold_start import StartupTimeline, existing_cameras, run_startup_tasks
+from frame_grabber import FrameGrabber, configure_capture, parse_capture_size, zoom_capture_size
+from metrics import LatencyTracker, MetricsServer
+from constraint_decoder import DecodeLog
+from serial_protocol import FrameEncoder
+from serial_publisher import ResultPublisher, encode_line
+from simulation import SimulatedCamera, open_simulated_serial
+from task_profile import load_profile
+from temporal_fusion import TemporalVoter
+
 # 配置路径
-YOLOV5_DIR = "/home/pi/yolo/yolov5-master"
 OUTPUT_DIR = "/home/pi/yolo/outcome"
-TEMP_DIR = os.path.join(YOLOV5_DIR, "temp_images")
-os.makedirs(TEMP_DIR, exist_ok=True)
 
-# 全局变量用于存储当前检测结果和串口状态
-current_result = ""
-serial_active = True
+# 任务配置（profiles/box.yaml）：模型权重与推理尺寸、数码变焦、六个区域的边界、去重补全规则、时间融合参数，
+# 可用 --profile 换成其他 yaml 文件，新的场地布局不必修改本脚本
+PROFILE = 'box'
 
+# 常驻检测器：本仓库的 box_detect.py 部署为 yolov5-master/detect.py（目录见任务配置的 model.yolov5_dir），
+# 需使用 /home/pi/PycharmProjects/box/.venv/bin/python 运行本脚本；
+# detect（torch）、yaml、serial 在用到时才导入，缩短开机后到打开摄像头的时间
 
-def apply_digital_zoom(frame, zoom_factor=1.3, center_x=0.5, center_y=0.65):
-    """应用数码变焦"""
-    h, w = frame.shape[:2]
-    crop_w = int(w / zoom_factor)
-    crop_h = int(h / zoom_factor)
+# 调试输出：为True时把每帧图片和标签写入输出目录（--output-dir）下的 detections，正常运行时不落盘
+DEBUG_OUTPUT = False
+# 调试输出的环形缓冲槽数：1 表示始终覆盖同一组文件，循环中不删除任何目录
+DEBUG_SLOTS = 1
 
-    # 计算中心点坐标
-    cx = int(w * center_x)
-    cy = int(h * center_y)
+# 流水线配置（队列长度与反压见 task_profile.py）：取结果超时（秒）、每隔多少帧打印一次各阶段延迟
+PIPELINE_TIMEOUT = 10.0
+STATS_INTERVAL = 10
 
-    # 计算裁剪区域
-    x1 = max(0, cx - crop_w // 2)
-    y1 = max(0, cy - crop_h // 2)
-    x2 = min(w, x1 + crop_w)
-    y2 = min(h, y1 + crop_h)
+# 摄像头采集配置：分辨率 (宽, 高) 与像素格式（None 为驱动默认，'MJPG' 为摄像头端压缩）
+CAPTURE_SIZE = (1280, 720)
+CAPTURE_FOURCC = None
 
-    # 裁剪并缩放
-    cropped = frame[y1:y2, x1:x2]
-    return cv2.resize(cropped, (w, h), interpolation=cv2.INTER_LINEAR)
+# 自适应调度配置：结果连续相同多少次后降速/暂停、降速后的推理间隔、暂停后的确认间隔、
+# 判定场景变化的区域帧差阈值（0~255 灰度平均绝对差）；确认间隔需小于 PIPELINE_TIMEOUT
+ADAPTIVE_STABLE_AFTER = 5
+ADAPTIVE_PAUSE_AFTER = 20
+ADAPTIVE_SLOW_INTERVAL = 2.0
+ADAPTIVE_RECHECK_INTERVAL = 8.0
+ADAPTIVE_CHANGE_THRESHOLD = 12.0
 
+# 画面未变时跳过推理：与上一次推理帧的区域帧差不超过该阈值时复用上一次结果，最多连续复用多少帧
+SCENE_CHANGE_THRESHOLD = 4.0
+SCENE_MAX_REUSE = 30
 
-def capture_image(cap, warmup_frames=10):
-    """拍摄单张图片并应用数码变焦"""
-    # 增加曝光预热帧
-    for _ in range(warmup_frames):
-        cap.read()
-        time.sleep(0.1)
+# 串口发送配置：结果变化时立即发送，不变时每 SERIAL_HEARTBEAT 秒重发一次；两次发送之间至少间隔 SERIAL_MIN_INTERVAL 秒
+SERIAL_HEARTBEAT = 1.0
+SERIAL_MIN_INTERVAL = 0.0
+# 串口协议版本：0 为 '7' 连接的六个结果字符串，1 为带序号、置信度和 CRC 的 16 字节二进制帧（见 serial_protocol.py）
+SERIAL_PROTOCOL = 0
 
-    # 正式拍摄
-    ret, frame = cap.read()
-    if not ret:
-        raise RuntimeError("摄像头读取失败")
+# 各环节耗时的滚动分位数统计（拍照、变焦、预处理、推理、NMS、区域划分、解码、串口写入、结果周期）
+metrics = LatencyTracker()
+
+# 任务配置（由命令行参数 --profile 加载）
+profile = None
+
+# 解码配置：随机补全的种子（None 为按固定优先级补全）与解码日志（None 为不记录），由命令行参数设置
+completion_seed = None
+decode_log = None
 
-    zoom_frame = apply_digital_zoom(frame)
-    return zoom_frame
+# 二进制串口帧编码器（协议版本 1 时由命令行参数设置）
+frame_encoder = None
 
 
-def load_class_names():
-    """加载类别名称"""
-    with open(os.path.join(YOLOV5_DIR, "data", "coco.yaml")) as f:
+def load_class_names(yolov5_dir):
+    """从 yolov5 目录下的 data/coco.yaml 加载类别名称"""
+    import yaml
+
+    with open(os.path.join(yolov5_dir, "data", "coco.yaml")) as f:
         data = yaml.safe_load(f)
         return data['names']
 
 
-def get_detected_labels(label_paths, names, img_size):
-    """获取检测结果标签，按六个固定区域排序，返回六位字符串（每个区域取最左对象）"""
-    img_w, img_h = img_size
-    results = []
-
-    # 定义六个区域的归一化边界 (x_min_ratio, x_max_ratio, y_min_ratio, y_max_ratio)
-    region_bounds = [
-        # 区域 a
-        (0.0, 0.219, 0.2, 0.5),
-        # 区域 b
-        (0.344, 0.609, 0.208, 0.5),
-        # 区域 c
-        (0.703, 1, 0.208, 0.5),
-        # 区域 d
-        (0.0, 0.219, 0.5, 1),
-        # 区域 e
-        (0.344, 0.609, 0.5, 1),
-        # 区域 f
-        (0.703, 1, 0.5, 1)
-    ]
-
-    for path in label_paths:
-        if not os.path.exists(path):
-            # 如果文件不存在，返回六个'x'
-            results.append(['x'] * 6)
-            continue
-
-        objects = []  # 存储检测到的对象信息
-
-        with open(path) as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) < 5:
-                    continue
-
-                # 解析数据
-                class_id = int(parts[0])
-                # 确保类别ID在有效范围内
-                if class_id < 0 or class_id >= len(names):
-                    continue
-
-                # 获取类别名称并确保为字符串
-                class_name = str(names[class_id])
-
-                x_center = float(parts[1])
-                y_center = float(parts[2])
-                width = float(parts[3])
-                height = float(parts[4])
-
-                # 转换为像素坐标
-                x_center_px = x_center * img_w
-                y_center_px = y_center * img_h
-                width_px = width * img_w
-                height_px = height * img_h
-
-                # 计算左上角坐标和中心点（用于区域判断）
-                x_min = x_center_px - width_px / 2
-                y_min = y_center_px - height_px / 2
-                obj_center_x = x_center_px  # 使用中心点坐标进行区域判断
-                obj_center_y = y_center_px
-
-                # 添加对象信息（包含中心点坐标）
-                objects.append({
-                    'name': class_name,
-                    'x_min': x_min,
-                    'center_x': obj_center_x,
-                    'center_y': obj_center_y
-                })
-
-        region_results = []  # 存储六个区域的结果
-
-        # 处理每个区域
-        for bounds in region_bounds:
-            x_min_ratio, x_max_ratio, y_min_ratio, y_max_ratio = bounds
-            # 计算当前区域的像素边界
-            x_min_region = x_min_ratio * img_w
-            x_max_region = x_max_ratio * img_w
-            y_min_region = y_min_ratio * img_h
-            y_max_region = y_max_ratio * img_h
-
-            # 筛选在当前区域内的对象（使用中心点判断）
-            in_region_objs = [
-                obj for obj in objects
-                if (x_min_region <= obj['center_x'] <= x_max_region) and
-                   (y_min_region <= obj['center_y'] <= y_max_region)
-            ]
-
-            if not in_region_objs:
-                region_results.append('x')  # 无对象时用'x'
-            else:
-                # 选择区域内最左侧对象（x_min最小）
-                leftmost_obj = min(in_region_objs, key=lambda x: x['x_min'])
-                region_results.append(leftmost_obj['name'])
-
-        results.append(region_results)
-
-    processed_results = []
-    for res in results:
-        processed = get_norepeat_string_box(res)  # 处理每个检测结果
-        processed_results.append(processed)
-
-    return processed_results
-
-
-
-def get_norepeat_string_box(char_list):
-    """处理单个检测结果（6个字符的列表），确保无重复数字"""
-    # 将输入复制避免修改原始数据
-    chars = char_list[:]
-    all_digits = set('123456')
-
-    # 步骤1: 消除重复数字 (忽略'x')
-    seen = set()
-    missing_set = all_digits - set(ch for ch in chars if ch != 'x')
-
-    for i in range(len(chars)):
-        if chars[i] == 'x':
-            continue
-        if chars[i] in seen:
-            if missing_set:
-                new_digit = missing_set.pop()
-                chars[i] = new_digit
-                seen.add(new_digit)
-        else:
-            seen.add(chars[i])
-
-    # 步骤2: 替换'x'为缺失数字
-    current_digits = set(ch for ch in chars if ch != 'x')
-    missing_for_x = all_digits - current_digits
-
-    for i in range(len(chars)):
-        if chars[i] == 'x' and missing_for_x:
-            new_digit = missing_for_x.pop()
-            chars[i] = new_digit
-
-    return ''.join(chars)
-
-
-def detect_single_image(cap, names, img_size):
-    """拍摄并检测单张图片，返回识别结果的字符串"""
-    # 清空临时目录 - 确保每次只处理最新照片
-    shutil.rmtree(TEMP_DIR, ignore_errors=True)
-    os.makedirs(TEMP_DIR, exist_ok=True)
-
-    # 清空YOLOv5输出目录 - 新增：确保只保留最新结果
-    detection_output = os.path.join(OUTPUT_DIR, "detections")
-    if os.path.exists(detection_output):
-        shutil.rmtree(detection_output, ignore_errors=True)
-
-    # 拍摄单张照片
-    frame = capture_image(cap)
-    img_path = os.path.join(TEMP_DIR, "temp.jpg")
-    cv2.imwrite(img_path, frame)
-
-    # 运行YOLOv5检测
-    subprocess.run([
-        '/home/pi/PycharmProjects/box/.venv/bin/python',
-        os.path.join(YOLOV5_DIR, "detect.py"),
-        '--source', TEMP_DIR,
-        '--project', OUTPUT_DIR,
-        '--name', 'detections',
-        '--exist-ok',
-        '--save-txt',
-        '--save-conf'
-    ], cwd=YOLOV5_DIR, check=True)
-
-    # 获取标签路径 - 注意YOLOv5生成的标签文件名
-    # 使用基本文件名而不是带扩展名的完整文件名
-    base_name = os.path.splitext(os.path.basename(img_path))[0]
-    label_path = os.path.join(OUTPUT_DIR, "detections", "labels", f"{base_name}.txt")
-
-    # 处理检测结果
-    detected_labels = get_detected_labels([label_path], names, img_size)
-
-    # 返回当前图片的识别结果字符串
-    if detected_labels:
-        return detected_labels[0]  # 返回第一个(唯一)处理后的字符串
-    return ""
-
-
-def serial_sender(port='/dev/serial0', baudrate=115200):
-    """持续通过串口发送当前检测结果"""
-    global current_result, serial_active
+def fuse_result(voter, region_votes, fresh=True):
+    """把一帧的区域结果加入时间融合，返回 (融合并去重补全后的六位字符串, 是否稳定, 六个区域的融合 (字符, 置信度))
+
+    fresh 为 False（画面未变，复用上一次推理的结果）时不重复计票，只取当前的融合结果
+    """
+    chars, confs, stable = voter.update(region_votes) if fresh else voter.result()
+    return profile.decode(chars, confs, completion_seed, metrics, decode_log), stable, list(zip(chars, confs))
+
+
+def next_result(pipeline, voter=None, scheduler=None):
+    """从流水线取出下一帧结果；启用时间融合时返回融合结果，返回 (六位字符串, 是否稳定, 六个区域的 (字符, 置信度))"""
+    result_str, region_votes, fresh = pipeline.get(timeout=PIPELINE_TIMEOUT)
+    metrics.tick('cycle')
+    stable = False
+    if voter is not None:
+        fused_str, stable, region_votes = fuse_result(voter, region_votes, fresh)
+        print(f"单帧结果: {result_str} 融合结果: {fused_str} 稳定: {stable}")
+        result_str = fused_str
+    if scheduler is not None and fresh:
+        # 复用的结果不是新的观测，不计入连续相同结果的次数
+        scheduler.observe_result(result_str)
+    return result_str, stable, region_votes
+
+
+def serial_message(long_string, result_str, region_votes, stable):
+    """串口报文：协议版本 0 为长字符串，版本 1 为当前结果的二进制帧"""
+    if frame_encoder is None:
+        return long_string
+    return frame_encoder(result_str, region_votes, stable)
+
+
+def make_scheduler(fast_interval, voter=None):
+    """创建自适应调度器，场景变化时清空时间融合历史"""
+    return AdaptiveScheduler(
+        profile.region_bounds,
+        fast_interval=fast_interval,
+        slow_interval=ADAPTIVE_SLOW_INTERVAL,
+        recheck_interval=ADAPTIVE_RECHECK_INTERVAL,
+        stable_after=ADAPTIVE_STABLE_AFTER,
+        pause_after=ADAPTIVE_PAUSE_AFTER,
+        change_threshold=ADAPTIVE_CHANGE_THRESHOLD,
+        on_change=voter.reset if voter is not None else None,
+    )
+
+
+def open_camera(simulate=None, sim_fps=15.0, probe_existing=False, size=CAPTURE_SIZE, fourcc=CAPTURE_FOURCC):
+    """打开摄像头（模拟模式下从视频文件或图片目录按帧率读取）并设置采集格式，返回 (cap, 图像尺寸 (宽, 高))
+
+    probe_existing 为 True 时跳过设备文件不存在的编号，不再逐个等待打开失败；
+    size、fourcc 为请求的分辨率与像素格式，图像尺寸以实际读到的帧为准
+    """
+    camera_indexes = [0, 1, 2, '/dev/my_camera']
+    cap = None
+    if simulate:
+        cap = SimulatedCamera(simulate, fps=sim_fps)
+        print(f"模拟摄像头: {simulate} ({sim_fps} fps)")
+    else:
+        for index in existing_cameras(camera_indexes) if probe_existing else camera_indexes:
+            cap = cv2.VideoCapture(index)
+            if cap.isOpened():
+                print(f"成功打开摄像头: {index}")
+                break
+            if cap:
+                cap.release()
+
+    if cap is None or not cap.isOpened():
+        raise RuntimeError("无法打开任何摄像头")
+
+    configure_capture(cap, size, fourcc)
+
+    # 获取图像尺寸
+    ret, frame = cap.read()
+    if not ret:
+        raise RuntimeError("无法获取摄像头画面")
+    return cap, (frame.shape[1], frame.shape[0])  # (width, height)
+
+
+def load_models(opt):
+    """加载检测模型或区域分类器（只加载一次），返回 (detector, classifier)；torch 在此处才导入"""
+    if opt.engine == 'classifier':
+        from region_classifier import RegionClassifier
+        return None, RegionClassifier(opt.classifier_weights)
+    return profile.load_detector(opt.backend, opt.weights), None
+
 
+def open_serial(port='/dev/serial0', baudrate=115200):
+    """打开串口，失败时返回 None（程序继续识别，只是不发送）"""
     try:
+        import serial
+
         ser = serial.Serial(
             port=port,
             baudrate=baudrate,
@@ -257,77 +180,187 @@ def serial_sender(port='/dev/serial0', baudrate=115200):
             timeout=1
         )
         print("串口已打开，开始发送数据...")
-
-        while serial_active:
-            if current_result:
-                ser.write(current_result.encode() + b'\n')
-                print(f"已发送: {current_result}")
-            time.sleep(1)  # 每秒发送一次
-
+        return ser
     except Exception as e:
         print(f"串口通信错误: {e}")
-    finally:
-        if 'ser' in locals() and ser.is_open:
-            ser.close()
-        print("串口已关闭")
+        return None
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--yolov5-dir', default=None,
+                        help="yolov5-master 目录（本仓库的检测文件部署为其中的 detect.py，类别名称取自其中的 data/coco.yaml），"
+                             "默认使用任务配置中的目录")
+    parser.add_argument('--profile', default=PROFILE,
+                        help="任务配置：profiles 目录下的名称或 yaml 文件路径（区域边界、变焦、解码规则、融合参数、默认权重）")
+    parser.add_argument('--weights', default=None,
+                        help="检测模型的 PyTorch 权重路径（导出模型在其旁边查找），默认使用任务配置中的权重")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help="输出目录（startup.json、调试输出；启动时清空）")
+    parser.add_argument('--backend', choices=['auto', 'pt', 'onnx', 'int8', 'openvino', 'torchscript'], default=None,
+                        help="推理后端，默认使用任务配置中的后端；auto 表示存在通过 export_model.py / quantize_model.py 校验的导出模型时优先使用，否则使用 .pt")
+    parser.add_argument('--engine', choices=['yolo', 'classifier'], default='yolo',
+                        help="识别引擎：yolo 为目标检测，classifier 为六区域批量分类")
+    parser.add_argument('--classifier-weights', default="/home/pi/yolo_outcome/region_cls_box.pt",
+                        help="区域分类器权重（由 region_classifier.py 训练得到）")
+    parser.add_argument('--fusion', action='store_true',
+                        help="启用置信度加权的时间融合：按区域投票输出融合结果，稳定后六个位置都发送稳定结果")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="启用自适应调度：结果收敛后降速直至暂停，区域帧差检测到场景变化时恢复全速")
+    parser.add_argument('--skip-unchanged', action='store_true',
+                        help="画面与上一次推理帧相比没有变化时跳过推理，复用上一次结果")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="随机补全的种子：缺失区域在并列最优结果中按种子和输入确定地选择；默认按固定优先级补全")
+    parser.add_argument('--decode-log', default=None,
+                        help="解码日志路径（JSON Lines），记录每次去重补全的输入与输出，可用 replay_decoder.py 重放")
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help="本机 HTTP 指标接口端口（GET http://127.0.0.1:<port>/metrics），0 为不启动")
+    parser.add_argument('--serial-heartbeat', type=float, default=SERIAL_HEARTBEAT,
+                        help="结果没有变化时的串口重发间隔（秒）；结果变化时立即发送")
+    parser.add_argument('--serial-protocol', type=int, choices=[0, 1], default=SERIAL_PROTOCOL,
+                        help="串口协议版本：0 为长字符串，1 为带序号、置信度和 CRC 的二进制帧")
+    parser.add_argument('--simulate', default=None,
+                        help="模拟模式：用视频文件或图片目录代替摄像头，串口改为 --sim-serial 指定的虚拟串口")
+    parser.add_argument('--sim-fps', type=float, default=15.0, help="模拟摄像头的帧率")
+    parser.add_argument('--sim-serial', choices=['memory', 'pty'], default='memory',
+                        help="模拟模式的串口：memory 为内存缓冲，pty 为伪终端（可用其他程序读取）")
+    parser.add_argument('--fast-start', action='store_true',
+                        help="启动优化：摄像头、模型、串口并行初始化，只尝试存在的摄像头设备；各启动节点的时刻写入 startup.json")
+    parser.add_argument('--zoom-mode', choices=['resize', 'crop'], default=None,
+                        help="数码变焦，默认使用任务配置中的 zoom_mode：resize 为裁剪后放大回采集尺寸，crop 为裁剪图直接送入 letterbox（少两次整帧重采样，不再纵向拉伸）")
+    parser.add_argument('--capture-size', type=parse_capture_size, default=CAPTURE_SIZE,
+                        help="请求的采集分辨率 宽x高；auto 为变焦裁剪后仍不低于推理尺寸的最小分辨率（货箱为 832x480）")
+    parser.add_argument('--mjpeg', action='store_true', help="请求 MJPEG 像素格式（摄像头端压缩，降低 USB 带宽）")
+    return parser.parse_args()
+
+
+def main(opt):
+    global profile, completion_seed, decode_log, frame_encoder
+
+    profile = load_profile(opt.profile)
+    profile.zoom_mode = opt.zoom_mode or profile.zoom_mode
+    completion_seed = opt.seed
+    frame_encoder = FrameEncoder('box', len(profile.region_bounds)) if opt.serial_protocol == 1 else None
+
+    # 检测文件从 --yolov5-dir（默认为任务配置中的目录）导入
+    opt.yolov5_dir = opt.yolov5_dir or profile.yolov5_dir
+    sys.path.insert(0, opt.yolov5_dir)
+
+    # 清空输出目录（仅在启动时执行一次，循环中不再删除目录）
+    if os.path.exists(opt.output_dir):
+        shutil.rmtree(opt.output_dir, ignore_errors=True)
+    os.makedirs(opt.output_dir, exist_ok=True)
+
+    # 解码日志（可选），可用 replay_decoder.py 离线重放
+    if opt.decode_log:
+        decode_log = DecodeLog(opt.decode_log)
+
+    # 采集分辨率：auto 时按推理尺寸与变焦倍数选择，画面更小，取帧与变焦的开销随之降低
+    capture_size = opt.capture_size
+    if capture_size == 'auto':
+        capture_size = zoom_capture_size(profile.imgsz, profile.zoom_factor, CAPTURE_SIZE)
+        print(f"采集分辨率: {capture_size[0]}x{capture_size[1]}")
+
+    # 打开摄像头、加载模型、打开串口（模拟模式下写入虚拟串口）；--fast-start 时三者并行
+    timeline = StartupTimeline(os.path.join(opt.output_dir, "startup.json"))
+
+    def start_camera():
+        cap, img_size = open_camera(
+            opt.simulate, opt.sim_fps, opt.fast_start, capture_size, 'MJPG' if opt.mjpeg else CAPTURE_FOURCC
+        )
+        # 启动后台取帧线程，丢弃前几帧（货箱为10帧）等待曝光稳定（与模型加载同时进行）
+        grabber = FrameGrabber(cap, settle_frames=profile.settle_frames).start()
+        timeline.mark('camera')
+        return cap, img_size, grabber
 
+    def start_models():
+        result = load_models(opt)
+        timeline.mark('model')
+        return result
 
-def main():
-    global current_result, serial_active
+    def start_serial():
+        result = open_simulated_serial(opt.sim_serial) if opt.simulate else open_serial()
+        timeline.mark('serial')
+        return result
 
-    # 清空输出目录
-    if os.path.exists(OUTPUT_DIR):
-        shutil.rmtree(OUTPUT_DIR, ignore_errors=True)
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    (cap, img_size, grabber), (detector, classifier), ser = run_startup_tasks(
+        [start_camera, start_models, start_serial], parallel=opt.fast_start
+    )
 
-    # 初始化摄像头
-    camera_indexes = [0, 1, 2, '/dev/my_camera']
-    cap = None
-    for index in camera_indexes:
-        cap = cv2.VideoCapture(index)
-        if cap.isOpened():
-            print(f"成功打开摄像头: {index}")
-            break
-        if cap:
-            cap.release()
+    # 加载类别名称
+    names = load_class_names(opt.yolov5_dir)
+    print(f"加载的类别名称: {names}")  # 调试输出
 
-    if cap is None or not cap.isOpened():
-        raise RuntimeError("无法打开任何摄像头")
+    debug_sink = None
+    if DEBUG_OUTPUT:
+        from detect import DebugSink
+        debug_sink = DebugSink(os.path.join(opt.output_dir, "detections"), names=names, slots=DEBUG_SLOTS)
+
+    # 启动串口发送线程：新结果发布后立即发送，不变时按心跳间隔重发；记录第一个字节发出的时刻
+    publisher = ResultPublisher(
+        ser, heartbeat=opt.serial_heartbeat, min_interval=SERIAL_MIN_INTERVAL, tracker=metrics,
+        encode=encode_line if frame_encoder is None else bytes,
+        on_first_write=lambda: timeline.mark('first_serial_byte'),
+    ).start()
+
+    # 置信度加权的时间融合（可选）
+    voter = None
+    if opt.fusion:
+        voter = TemporalVoter(
+            profile.fusion_window, profile.fusion_min_frames, profile.fusion_min_share,
+            num_regions=len(profile.region_bounds),
+        )
 
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+    # 自适应调度（可选）：场景变化时同时清空融合历史
+    scheduler = make_scheduler(profile.capture_interval, voter) if opt.adaptive else None
 
-    # 获取图像尺寸
-    ret, frame = cap.read()
-    if not ret:
-        raise RuntimeError("无法获取摄像头画面")
-    img_size = (frame.shape[1], frame.shape[0])  # (width, height)
+    # 画面未变时跳过推理（可选）
+    scene_gate = None
+    if opt.skip_unchanged:
+        scene_gate = SceneChangeGate(profile.region_bounds, SCENE_CHANGE_THRESHOLD, SCENE_MAX_REUSE)
 
-    # 加载类别名称
-    names = load_class_names()
-    print(f"加载的类别名称: {names}")  # 调试输出
+    # 启动检测流水线：拍照/变焦/预处理 → 推理 → 区域划分与去重补全（见 task_profile.py），检测失败的帧丢弃
+    pipeline = profile.build_pipeline(
+        grabber, detector, img_size, metrics, completion_seed, scheduler, scene_gate,
+        names=names, debug_sink=debug_sink, classifier=classifier, decode_log=decode_log,
+    ).start()
 
-    # 启动串口发送线程
-    serial_thread = threading.Thread(target=serial_sender)
-    serial_thread.daemon = True
-    serial_thread.start()
+    # 本机指标接口（可选）
+    metrics_server = None
+    if opt.metrics_port:
+        metrics_server = MetricsServer(
+            metrics, opt.metrics_port, extra=lambda: {'pipeline': pipeline.stats(), 'startup': timeline.snapshot()}
+        ).start()
 
-    # 初始拍摄6张照片构建基础字符串
+    # 初始拍摄6张照片构建基础字符串（融合结果提前稳定时直接结束）
     result_list = []
     for i in range(6):
         print(f"初始拍摄 #{i + 1}/6")
-        result_str = detect_single_image(cap, names, img_size)
+        result_str, stable, region_votes = next_result(pipeline, voter, scheduler)
+        timeline.mark('first_result')
         print(f"检测结果: {result_str}")  # 调试输出
         result_list.append(result_str)
-        current_result = '7'.join(result_list) + '7'
+        # 融合结果稳定时，六个位置都发送稳定结果，下游无需再等待
+        current_result = '7'.join([result_str] * 6 if stable else result_list) + '7'
+        publisher.publish(serial_message(current_result, result_str, region_votes, stable))
         print(f"当前结果: {current_result}")
+        if stable:
+            # 用稳定结果补足六个位置，保证后续发送长度不变
+            result_list.extend([result_str] * (6 - len(result_list)))
+            break
 
     # 30次循环更新结果
     for i in range(100):
         print(f"更新循环 #{i + 1}/30")
         # 拍摄新照片并检测
-        new_result = detect_single_image(cap, names, img_size)
+        new_result, stable, region_votes = next_result(pipeline, voter, scheduler)
         print(f"新检测结果: {new_result}")  # 调试输出
+        if (i + 1) % STATS_INTERVAL == 0:
+            print(f"流水线统计: {pipeline.stats_line()}")
+            print(f"延迟分位数 p50/p95/p99: {metrics.summary_line()}", flush=True)
+            if scheduler is not None:
+                print(f"调度状态: {scheduler.state} 跳过帧数: {scheduler.skipped}")
+            if scene_gate is not None:
+                print(f"画面未变跳过推理: {scene_gate.skipped}/{scene_gate.checked}")
 
         # 更新结果列表
         if len(result_list) >= 6:
@@ -335,15 +368,24 @@ def main():
         result_list.append(new_result)
 
         # 更新当前结果
-        current_result = '7'.join(result_list) + '7'
+        current_result = '7'.join([new_result] * 6 if stable else result_list) + '7'
+        publisher.publish(serial_message(current_result, new_result, region_votes, stable))
         print(f"更新后结果: {current_result}")
 
     # 清理工作
-    serial_active = False
-    serial_thread.join(timeout=2.0)
+    publisher.stop()
+    if ser is not None and ser.is_open:
+        ser.close()
+    print("串口已关闭")
+    pipeline.stop()
+    grabber.stop()
     cap.release()
+    if metrics_server is not None:
+        metrics_server.stop()
+    if decode_log is not None:
+        decode_log.close()
     print("程序执行完毕")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(parse_opt())
\ No newline at end of file
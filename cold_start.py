@@ -0,0 +1,84 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def seconds_since_boot():
+    """开机以来的秒数（含休眠时间），与 systemd-analyze 的时间轴一致"""
+    return time.clock_gettime(time.CLOCK_BOOTTIME)
+
+
+def process_start_since_boot():
+    """本进程的启动时刻（开机后秒数），取自 /proc/self/stat 的 starttime，包含解释器启动与模块导入的时间"""
+    try:
+        with open('/proc/self/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def existing_cameras(indexes):
+    """过滤掉设备文件不存在的摄像头（整数 N 对应 /dev/videoN），避免逐个等待打开失败"""
+    if not os.path.isdir('/dev'):
+        return list(indexes)
+    return [i for i in indexes if os.path.exists(f"/dev/video{i}" if isinstance(i, int) else i)]
+
+
+def run_startup_tasks(tasks, parallel=True):
+    """依次或并行执行启动任务（无参数函数），按顺序返回各自的结果；任一任务出错时抛出该异常"""
+    if not parallel:
+        return [task() for task in tasks]
+    with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="startup") as executor:
+        futures = [executor.submit(task) for task in tasks]
+        return [future.result() for future in futures]
+
+
+class StartupTimeline:
+    """记录启动过程各节点（摄像头、模型、串口、首个结果、首个串口字节）的时刻，写入 JSON 文件
+
+    时刻均为开机后秒数，同时给出相对进程启动的耗时；每个节点只记录第一次。
+    文件先写临时文件再 rename，断电也不会留下半个文件，可在下次启动或远程登录时查看
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.process_start = process_start_since_boot()
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        with self._lock:
+            if name in self.marks:
+                return
+            self.marks[name] = seconds_since_boot()
+        message = f"启动节点 {name}: 开机后 {self.marks[name]:.2f}s"
+        if self.process_start is not None:
+            message += f"，进程启动后 {self.marks[name] - self.process_start:.2f}s"
+        print(message)
+        self.save()
+
+    def snapshot(self):
+        with self._lock:
+            marks = dict(self.marks)
+        data = {
+            'process_start_s': None if self.process_start is None else round(self.process_start, 3),
+            'since_boot_s': {name: round(t, 3) for name, t in marks.items()},
+            'since_process_start_s': {},
+        }
+        if self.process_start is not None:
+            data['since_process_start_s'] = {name: round(t - self.process_start, 3) for name, t in marks.items()}
+        return data
+
+    def save(self):
+        if self.path is None:
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"保存启动时间失败: {e}")
@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+import zlib
+from itertools import permutations
+
+import numpy as np
+
+DIGITS = '123456'
+LETTERS = 'abcdef'  # 第 i 个区域对应的字母为 LETTERS[i]
+LETTER = '*'  # 约束表中表示“该区域为字母”的符号
+ALPHABET = DIGITS + LETTER
+
+# 置信度相同时的优先级：约束表按优先级排序，argmax 取排在最前面的合法结果
+BOX_POSITION_PRIORITY = (0, 1, 2, 3, 4, 5)
+BOX_DIGIT_PRIORITY = '123456'
+STACK_LETTER_PRIORITY = (1, 5, 0, 2, 3, 4)  # 没有识别到字母时，字母优先放在哪个区域
+STACK_POSITION_PRIORITY = (1, 5, 0, 2, 3, 4)  # 数字缺失时，按该顺序为区域补数字
+STACK_DIGIT_PRIORITY = '645123'  # 补数字时优先使用的数字
+
+
+def _digit_rows(position_priority, digit_priority, letter_pos=None):
+    """按优先级枚举把互不相同的数字填入各区域（letter_pos 处为字母）的所有方式，返回 ALPHABET 下标行列表
+
+    itertools.permutations 按字典序输出，第 k 个数字填入第 k 优先的区域，
+    因此排在越前面的行，在越优先的区域上使用越优先的数字
+    """
+    positions = [p for p in position_priority if p != letter_pos]
+    rows = []
+    for digits in permutations(digit_priority, len(positions)):
+        row = [ALPHABET.index(LETTER)] * len(position_priority)
+        for pos, digit in zip(positions, digits):
+            row[pos] = ALPHABET.index(digit)
+        rows.append(row)
+    return rows
+
+
+def build_table(position_priority, digit_priority, letter_priority=None):
+    """由优先级生成约束表：letter_priority 为 None 时各区域都是互不相同的数字，
+    否则恰有一个区域为字母，字母所在区域按 letter_priority 的顺序枚举（越靠前越优先）
+    """
+    if letter_priority is None:
+        rows = _digit_rows(position_priority, digit_priority)
+    else:
+        rows = [row for pos in letter_priority for row in _digit_rows(position_priority, digit_priority, pos)]
+    return np.array(rows, dtype=np.int64)
+
+
+# 货箱：六个区域为 1~6 的一个排列，共 720 种
+BOX_TABLE = build_table(BOX_POSITION_PRIORITY, BOX_DIGIT_PRIORITY)
+
+# 纸垛：一个区域为字母，其余五个区域为 1~6 中互不相同的五个数字，共 6 × 720 = 4320 种
+STACK_TABLE = build_table(STACK_POSITION_PRIORITY, STACK_DIGIT_PRIORITY, STACK_LETTER_PRIORITY)
+
+
+def score_matrix(region_chars, confs=None):
+    """各区域识别结果 → (区域数, len(ALPHABET)) 的得分矩阵
+
+    数字计入对应数字列，字母 a~f 都计入 LETTER 列；'x'、None 及其他字符不计分。
+    confs 为 None 时每个识别结果计 1 分
+    """
+    scores = np.zeros((len(region_chars), len(ALPHABET)))
+    for i, char in enumerate(region_chars):
+        conf = 1.0 if confs is None else float(confs[i])
+        if char is None:
+            continue
+        if char in DIGITS:
+            scores[i, ALPHABET.index(char)] += conf
+        elif char in LETTERS:
+            scores[i, ALPHABET.index(LETTER)] += conf
+    return scores
+
+
+def completion_key(region_chars, confs=None, seed=None):
+    """随机补全所用的键：由种子和输入唯一确定，跨进程、跨机器一致（不依赖 Python 的 hash 随机化）"""
+    confs = None if confs is None else [float(c) for c in confs]
+    return zlib.crc32(json.dumps([seed, list(region_chars), confs]).encode())
+
+
+def decode(region_chars, table, confs=None, seed=None):
+    """在约束表中选出与识别结果一致的置信度总和最大的合法结果，返回字符串
+
+    穷举整张表（最多 4320 行 × 6 个区域的一次取值与求和），耗时固定且与输入无关，不存在循环到找不到解的情况。
+    总分相同的结果（如缺失区域的补全）：seed 为 None 时取表中靠前（优先级高）的结果；
+    否则由 completion_key(输入, seed) 在并列结果中选择，同样的种子和输入总是得到同样的输出。
+    结果中的字母为其所在区域对应的字母（区域 i 为 LETTERS[i]）
+    """
+    scores = score_matrix(region_chars, confs)
+    totals = scores[np.arange(table.shape[1]), table].sum(axis=1)
+    ties = np.flatnonzero(totals == totals.max())
+    if seed is None:
+        best = table[ties[0]]
+    else:
+        best = table[ties[completion_key(region_chars, confs, seed) % len(ties)]]
+    return ''.join(LETTERS[i] if ALPHABET[code] == LETTER else ALPHABET[code] for i, code in enumerate(best))
+
+
+def decode_box(region_chars, confs=None, seed=None):
+    """货箱：六个区域输出 1~6 互不重复"""
+    return decode(region_chars, BOX_TABLE, confs, seed)
+
+
+def decode_stack(region_chars, confs=None, seed=None):
+    """纸垛：一个区域输出其对应字母，其余五个区域输出互不重复的数字"""
+    return decode(region_chars, STACK_TABLE, confs, seed)
+
+
+DECODERS = {'box': decode_box, 'stack': decode_stack}
+
+
+class DecodeLog:
+    """解码日志：每次解码追加一行 JSON（任务、输入、置信度、种子、输出），供 replay_decoder.py 离线重放"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()  # 流水线解析线程与主循环（时间融合）都会解码
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, task, region_chars, confs, seed, output):
+        record = {
+            'time': round(time.time(), 3),
+            'task': task,
+            'chars': list(region_chars),
+            'confs': None if confs is None else [float(c) for c in confs],
+            'seed': seed,
+            'output': output,
+        }
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
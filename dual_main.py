@@ -0,0 +1,326 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import box_main
+from adaptive_scheduler import AdaptiveScheduler, SceneChangeGate
+from cold_start import StartupTimeline, run_startup_tasks
+from frame_grabber import FrameGrabber, parse_capture_size, zoom_capture_size
+from metrics import LatencyTracker, MetricsServer
+from result_journal import ResultJournal
+from serial_protocol import FrameEncoder
+from serial_publisher import ResultPublisher, encode_line
+from simulation import open_simulated_serial
+from task_profile import load_profile
+from temporal_fusion import TemporalVoter
+
+# 单进程服务多个任务：每个任务由一个配置文件（profiles/*.yaml）描述，模型各加载一次，
+# 共用摄像头、取帧线程、串口和 torch 线程池；由串口命令或 --task 选择当前任务，切换时只重建流水线，不重新加载模型
+YOLOV5_DIR = "/home/pi2/yolo/yolov5-master"
+# 与 stack_main.py 的输出目录相同：由单任务服务切换过来后，两者按同一个任务配置的 output.journal 读写纸垛的结果日志
+OUTPUT_DIR = "/home/pi2/yolo/outcome"
+PIPELINE_TIMEOUT = 10.0
+STATS_INTERVAL = 10
+SERIAL_PROTOCOL = 0
+SERIAL_HEARTBEAT = 1.0
+SERIAL_MIN_INTERVAL = 0.0
+RESULT_COMPACT_EVERY = 200
+
+# 各环节耗时统计由所有任务共用，任务切换耗时记为 'switch'
+metrics = LatencyTracker()
+
+
+def task_commands(names):
+    """串口命令 → 任务名：一行一个任务名，首字母不与其他任务冲突时也可只发首字母，大小写不限"""
+    commands = {name.lower(): name for name in names}
+    initials = [name[0].lower() for name in names]
+    for name, initial in zip(names, initials):
+        if initials.count(initial) == 1 and initial not in commands:
+            commands[initial] = name
+    return commands
+
+
+class TaskCommands:
+    """后台读取串口命令，记录最近一次请求的任务；串口不支持读取（如内存串口）时不启动"""
+
+    def __init__(self, ser, commands):
+        self.ser = ser
+        self.commands = commands  # 命令 → 任务名
+        self._requested = None
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self.ser is None or not hasattr(self.ser, 'readline'):
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="commands", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def request(self, task):
+        with self._lock:
+            self._requested = task
+
+    def take(self):
+        """取出最近一次请求的任务（没有新请求时为 None）"""
+        with self._lock:
+            task, self._requested = self._requested, None
+            return task
+
+    def _run(self):
+        while self._running:
+            try:
+                line = self.ser.readline()
+            except Exception as e:
+                if self._running:
+                    print(f"读取串口命令失败: {e}")
+                    time.sleep(1.0)
+                continue
+            command = line.decode(errors='ignore').strip().lower()
+            if not command:
+                continue
+            if command in self.commands:
+                self.request(self.commands[command])
+                print(f"收到切换命令: {command}")
+            else:
+                print(f"未知串口命令: {command}")
+
+
+class TaskRunner:
+    """一个任务在共享摄像头与已加载模型上的识别流程：流水线、时间融合、调度与最近的结果"""
+
+    def __init__(self, profile, detector, grabber, img_size, opt, journal=None):
+        self.profile = profile
+        self.name = profile.name
+        self.detector = detector
+        self.grabber = grabber
+        self.img_size = img_size
+        self.opt = opt
+        self.journal = journal  # 结果日志（配置了 output.journal 时），启动时恢复最近的结果
+        self.history = deque(journal.load() if journal is not None else [], maxlen=40)
+        self.frame_encoder = None
+        if opt.serial_protocol == 1:
+            # 二进制帧的任务标志位：有字母区域的任务按纸垛编码，否则按货箱编码
+            self.frame_encoder = FrameEncoder(
+                'box' if profile.letter_priority is None else 'stack', len(profile.region_bounds)
+            )
+        self.pipeline = None
+        self.voter = self.scheduler = self.scene_gate = None
+
+    def start(self):
+        """建立新的流水线；融合、调度状态从头开始，结果历史保留"""
+        profile = self.profile
+        self.voter = (
+            TemporalVoter(
+                profile.fusion_window, profile.fusion_min_frames, profile.fusion_min_share,
+                num_regions=len(profile.region_bounds),
+            )
+            if self.opt.fusion else None
+        )
+        self.scheduler = None
+        if self.opt.adaptive:
+            self.scheduler = AdaptiveScheduler(
+                profile.region_bounds, fast_interval=profile.capture_interval,
+                on_change=self.voter.reset if self.voter is not None else None,
+            )
+        self.scene_gate = SceneChangeGate(profile.region_bounds) if self.opt.skip_unchanged else None
+        self.pipeline = profile.build_pipeline(
+            self.grabber, self.detector, self.img_size, metrics, self.opt.seed, self.scheduler, self.scene_gate
+        ).start()
+        return self
+
+    def stop(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+
+    def step(self):
+        """取下一帧结果，返回要发送的串口报文；配置了 wait_full 时不足6个结果且未稳定返回 None"""
+        result_str, region_votes, fresh = self.pipeline.get(timeout=PIPELINE_TIMEOUT)
+        metrics.tick('cycle')
+        stable = False
+        if self.voter is not None:
+            # 画面未变时复用的结果不重复计票
+            chars, confs, stable = self.voter.update(region_votes) if fresh else self.voter.result()
+            fused_str = self.profile.decode(chars, confs, self.opt.seed)
+            print(f"[{self.name}] 单帧结果: {result_str} 融合结果: {fused_str} 稳定: {stable}")
+            result_str, region_votes = fused_str, list(zip(chars, confs))
+        if self.scheduler is not None and fresh:
+            self.scheduler.observe_result(result_str)
+        print(f"[{self.name}] 新结果: {result_str}")
+        self.history.append(result_str)
+        if self.journal is not None:
+            self.journal.append(result_str)
+
+        if stable:
+            recent = [result_str] * 6
+        elif self.profile.wait_full and len(self.history) < 6:
+            return None
+        else:
+            recent = list(self.history)[-6:]
+        long_string = '7'.join(str(x) for x in recent) + '7'
+        print(f"[{self.name}] 长字符串: {long_string}")
+        if self.frame_encoder is None:
+            return long_string
+        return self.frame_encoder(result_str, region_votes, stable)
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="单进程加载多个任务配置的模型，由串口命令切换当前任务")
+    parser.add_argument('--profiles', nargs='+', default=['box', 'stack'],
+                        help="任务配置：profiles 目录下的名称或 yaml 文件路径")
+    parser.add_argument('--task', default=None, help="启动时的任务名，默认为第一个配置")
+    parser.add_argument('--yolov5-dir', default=YOLOV5_DIR,
+                        help="yolov5-master 目录（box_detect.py 或 stack_detect.py 部署为其中的 detect.py，两者可通用）")
+    parser.add_argument('--backend', choices=['auto', 'pt', 'onnx', 'int8', 'openvino', 'torchscript'], default=None,
+                        help="推理后端，默认使用各配置中的后端")
+    parser.add_argument('--threads', type=int, default=0, help="torch 推理线程数（两个模型共用），0 为不设置")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help="纸垛结果日志与 startup.json 所在目录")
+    parser.add_argument('--fusion', action='store_true', help="启用置信度加权的时间融合")
+    parser.add_argument('--adaptive', action='store_true', help="启用自适应调度")
+    parser.add_argument('--skip-unchanged', action='store_true', help="画面未变时跳过推理")
+    parser.add_argument('--seed', type=int, default=None, help="随机补全的种子，默认按固定优先级补全")
+    parser.add_argument('--serial-protocol', type=int, choices=[0, 1], default=SERIAL_PROTOCOL,
+                        help="串口协议版本：0 为长字符串，1 为二进制帧（帧内标志位区分有无字母区域的任务）")
+    parser.add_argument('--serial-heartbeat', type=float, default=SERIAL_HEARTBEAT,
+                        help="结果没有变化时的串口重发间隔（秒）")
+    parser.add_argument('--metrics-port', type=int, default=0, help="本机指标接口端口，0 为不启动")
+    parser.add_argument('--simulate', default=None, help="模拟模式：用视频文件或图片目录代替摄像头")
+    parser.add_argument('--sim-fps', type=float, default=15.0, help="模拟摄像头的帧率")
+    parser.add_argument('--sim-serial', choices=['memory', 'pty'], default='pty',
+                        help="模拟模式的串口；pty 可用 `echo box > <port>` 发送切换命令")
+    parser.add_argument('--fast-start', action='store_true', help="摄像头、两个模型、串口并行初始化")
+    parser.add_argument('--zoom-mode', choices=['resize', 'crop'], default=None,
+                        help="数码变焦模式，默认使用各配置中的 zoom_mode；crop 为裁剪图直接送入 letterbox")
+    parser.add_argument('--capture-size', type=parse_capture_size, default=box_main.CAPTURE_SIZE,
+                        help="请求的采集分辨率 宽x高；auto 为各任务变焦裁剪后仍不低于推理尺寸的最小分辨率中最大者")
+    parser.add_argument('--mjpeg', action='store_true', help="请求 MJPEG 像素格式（摄像头端压缩，降低 USB 带宽）")
+    return parser.parse_args()
+
+
+def main(opt):
+    os.makedirs(opt.output_dir, exist_ok=True)
+    sys.path.insert(0, opt.yolov5_dir)
+    if opt.threads:
+        import torch
+        torch.set_num_threads(opt.threads)
+
+    profiles = [load_profile(p) for p in opt.profiles]
+    for profile in profiles:
+        profile.zoom_mode = opt.zoom_mode or profile.zoom_mode
+    names = [profile.name for profile in profiles]
+    if len(set(names)) != len(names):
+        raise ValueError(f"任务名重复: {names}")
+    task = opt.task or names[0]
+    if task not in names:
+        raise ValueError(f"未知任务 {task}，可选: {names}")
+
+    # 采集分辨率由各任务共用，auto 时取能满足所有任务的最小分辨率
+    capture_size = opt.capture_size
+    if capture_size == 'auto':
+        capture_size = max(zoom_capture_size(p.imgsz, p.zoom_factor, box_main.CAPTURE_SIZE) for p in profiles)
+        print(f"采集分辨率: {capture_size[0]}x{capture_size[1]}")
+
+    timeline = StartupTimeline(os.path.join(opt.output_dir, "startup.json"))
+
+    def start_camera():
+        cap, img_size = box_main.open_camera(
+            opt.simulate, opt.sim_fps, opt.fast_start, capture_size, 'MJPG' if opt.mjpeg else None
+        )
+        # 各任务共用一个取帧线程，按需要最多的任务丢弃曝光未稳定的帧
+        grabber = FrameGrabber(cap, settle_frames=max(p.settle_frames for p in profiles)).start()
+        timeline.mark('camera')
+        return cap, img_size, grabber
+
+    def start_model(profile):
+        def load():
+            detector = profile.load_detector(opt.backend)
+            timeline.mark(f'{profile.name}_model')
+            return detector
+        return load
+
+    def start_serial():
+        ser = open_simulated_serial(opt.sim_serial) if opt.simulate else box_main.open_serial()
+        timeline.mark('serial')
+        return ser
+
+    (cap, img_size, grabber), *detectors, ser = run_startup_tasks(
+        [start_camera, *[start_model(p) for p in profiles], start_serial], parallel=opt.fast_start
+    )
+
+    runners = {}
+    for profile, detector in zip(profiles, detectors):
+        journal = None
+        if profile.journal:
+            journal = ResultJournal(os.path.join(opt.output_dir, profile.journal), compact_every=RESULT_COMPACT_EVERY)
+        runners[profile.name] = TaskRunner(profile, detector, grabber, img_size, opt, journal)
+
+    # 各任务的报文格式可能不同，二进制帧直接发送
+    publisher = ResultPublisher(
+        ser, heartbeat=opt.serial_heartbeat, min_interval=SERIAL_MIN_INTERVAL, tracker=metrics,
+        encode=encode_line if opt.serial_protocol == 0 else bytes,
+        on_first_write=lambda: timeline.mark('first_serial_byte'),
+    ).start()
+    commands = TaskCommands(ser, task_commands(names)).start()
+
+    current = runners[task].start()
+    print(f"当前任务: {current.name}")
+
+    metrics_server = None
+    if opt.metrics_port:
+        metrics_server = MetricsServer(metrics, opt.metrics_port, extra=lambda: {
+            'task': current.name, 'pipeline': current.pipeline.stats() if current.pipeline else {},
+            'startup': timeline.snapshot(),
+        }).start()
+
+    frame_count = 0
+    try:
+        while True:
+            requested = commands.take()
+            if requested is not None and requested != current.name:
+                # 模型已常驻内存，切换只需停止当前流水线并建立新任务的流水线
+                with metrics.timer('switch'):
+                    current.stop()
+                    current = runners[requested].start()
+                print(f"已切换到任务: {current.name}")
+
+            message = current.step()
+            timeline.mark('first_result')
+            if message is not None:
+                publisher.publish(message)
+
+            frame_count += 1
+            if frame_count % STATS_INTERVAL == 0:
+                print(f"流水线统计: {current.pipeline.stats_line()}")
+                print(f"延迟分位数 p50/p95/p99: {metrics.summary_line()}", flush=True)
+
+    except KeyboardInterrupt:
+        print("\n程序被用户中断")
+    finally:
+        commands.stop()
+        current.stop()
+        publisher.stop()
+        if ser is not None and ser.is_open:
+            ser.close()
+        grabber.stop()
+        cap.release()
+        for runner in runners.values():
+            if runner.journal is not None:
+                runner.journal.close()
+        if metrics_server is not None:
+            metrics_server.stop()
+        print("资源已释放")
+
+
+if __name__ == "__main__":
+    main(parse_opt())
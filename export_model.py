@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import sys
+from glob import glob
+
+import cv2
+import numpy as np
+
+from task_profile import load_profile
+
+
+def xywh_iou(a, b):
+    """计算两组归一化 xywh 框两两之间的 IoU，返回 (len(a), len(b)) 矩阵"""
+    a_min, a_max = a[:, None, :2] - a[:, None, 2:4] / 2, a[:, None, :2] + a[:, None, 2:4] / 2
+    b_min, b_max = b[None, :, :2] - b[None, :, 2:4] / 2, b[None, :, :2] + b[None, :, 2:4] / 2
+    inter = np.clip(np.minimum(a_max, b_max) - np.maximum(a_min, b_min), 0, None).prod(2)
+    area_a = a[:, None, 2:4].prod(2)
+    area_b = b[None, :, 2:4].prod(2)
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+def match_detections(ref, out, iou_thres=0.5, conf_tol=0.1):
+    """检查导出模型的检测结果与 PyTorch 是否一致：数量相同、每个框都能找到同类别且 IoU、置信度足够接近的框"""
+    if len(ref) != len(out):
+        return False
+    if not len(ref):
+        return True
+    iou = xywh_iou(ref, out)
+    used = set()
+    for i in np.argsort(-ref[:, 4]):
+        candidates = [
+            j for j in np.argsort(-iou[i])
+            if j not in used and iou[i, j] >= iou_thres and ref[i, 5] == out[j, 5]
+            and abs(ref[i, 4] - out[j, 4]) <= conf_tol
+        ]
+        if not candidates:
+            return False
+        used.add(candidates[0])
+    return True
+
+
+def load_val_frames(val_dir):
+    """读取验证集目录中的所有图片（按文件名排序）"""
+    paths = sorted(p for ext in ('jpg', 'jpeg', 'png', 'bmp') for p in glob(os.path.join(val_dir, f"*.{ext}")))
+    frames = []
+    for path in paths:
+        frame = cv2.imread(path)
+        if frame is not None:
+            frames.append((os.path.basename(path), frame))
+    return frames
+
+
+def verify(detector_cls, weights, artifact, frames, imgsz, iou_thres=0.5, conf_tol=0.1):
+    """在验证集上逐帧对比 PyTorch 与导出模型的检测结果，返回报告字典"""
+    reference = detector_cls(weights=weights, imgsz=(imgsz, imgsz), backend='pt', device='cpu')
+    candidate = detector_cls(weights=artifact, imgsz=(imgsz, imgsz), device='cpu')
+
+    mismatches = []
+    for name, frame in frames:
+        if not match_detections(reference(frame), candidate(frame), iou_thres, conf_tol):
+            mismatches.append(name)
+
+    # 各阶段平均耗时（毫秒）：预处理、推理、NMS
+    def speed(detector):
+        return [round(dt.t / max(len(frames), 1) * 1e3, 1) for dt in detector.dt]
+
+    return {
+        'weights': str(weights),
+        'artifact': str(artifact),
+        'frames': len(frames),
+        'mismatches': mismatches,
+        'agreement': 1 - len(mismatches) / max(len(frames), 1),
+        'pt_speed_ms': speed(reference),
+        'artifact_speed_ms': speed(candidate),
+    }
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="将训练好的 .pt 权重导出为 CPU 推理后端并与 PyTorch 对比校验")
+    parser.add_argument('--task', required=True,
+                        help="任务配置：profiles 目录下的名称（box、stack）或 yaml 文件路径，提供默认的目录、权重与尺寸")
+    parser.add_argument('--backend', choices=['onnx', 'openvino', 'torchscript'], default='onnx',
+                        help="导出的推理后端；torchscript 为免重建模型的快照，可缩短开机后首次加载模型的时间")
+    parser.add_argument('--weights', default=None, help="PyTorch 权重路径，默认使用任务配置中的权重")
+    parser.add_argument('--imgsz', type=int, default=None, help="推理尺寸，默认使用任务配置中的尺寸")
+    parser.add_argument('--yolov5-dir', default=None, help="yolov5-master 目录，默认使用任务配置中的目录")
+    parser.add_argument('--val-dir', required=True, help="验证集图片目录（现场采集的帧）")
+    parser.add_argument('--iou-thres', type=float, default=0.5, help="判定两个框一致的最小 IoU")
+    parser.add_argument('--conf-tol', type=float, default=0.1, help="判定两个框一致的最大置信度差")
+    parser.add_argument('--min-agreement', type=float, default=1.0, help="逐帧一致率低于该值时不标记为可用")
+    parser.add_argument('--skip-export', action='store_true', help="只校验已存在的导出模型")
+    return parser.parse_args()
+
+
+def main(opt):
+    profile = load_profile(opt.task)
+    yolov5_dir = opt.yolov5_dir or profile.yolov5_dir
+    weights = opt.weights or profile.weights
+    imgsz = opt.imgsz or profile.imgsz
+
+    # 本仓库的 box_detect.py / stack_detect.py 部署为 yolov5-master/detect.py
+    sys.path.insert(0, yolov5_dir)
+    from detect import VERIFIED_SUFFIX, Detector, export_path
+
+    artifact = export_path(weights, opt.backend)
+    marker = f"{artifact}{VERIFIED_SUFFIX}"
+    if os.path.exists(marker):
+        os.remove(marker)  # 重新导出或校验前先撤销旧的可用标记
+
+    if not opt.skip_export:
+        from export import run as export_run
+        export_run(weights=weights, imgsz=(imgsz, imgsz), include=(opt.backend,), device='cpu', simplify=True)
+    if not os.path.exists(artifact):
+        raise FileNotFoundError(f"未找到导出模型: {artifact}")
+
+    frames = load_val_frames(opt.val_dir)
+    if not frames:
+        raise RuntimeError(f"验证集目录中没有图片: {opt.val_dir}")
+
+    report = verify(Detector, weights, artifact, frames, imgsz, opt.iou_thres, opt.conf_tol)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if report['agreement'] >= opt.min_agreement:
+        # 写入可用标记后，Detector(backend='auto') 会默认使用该导出模型
+        with open(marker, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"校验通过，已写入 {marker}")
+    else:
+        print(f"校验未通过：一致率 {report['agreement']:.3f} < {opt.min_agreement}，继续使用 PyTorch 权重")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(parse_opt())
@@ -0,0 +1,106 @@
+import argparse
+import threading
+import time
+
+import cv2
+
+
+class FrameGrabber:
+    """后台取帧线程：持续读取摄像头并只保留最新一帧，替代每次拍照前的预热循环"""
+
+    def __init__(self, cap, settle_frames=10, light_change=30.0):
+        self.cap = cap
+        # 启动时或检测到光照突变后丢弃的帧数，等待自动曝光稳定
+        self.settle_frames = settle_frames
+        # 相邻两帧平均亮度变化超过该值视为光照突变，None 表示关闭检测
+        self.light_change = light_change
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0  # 最新帧序号
+        self._read_seq = 0  # 上次被取走的帧序号
+        self._settle_left = settle_frames
+        self._brightness = None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """启动取帧线程"""
+        self._running = True
+        self._thread = threading.Thread(target=self._grab_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止取帧线程（不释放摄像头）"""
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def _grab_loop(self):
+        while self._running:
+            ret, frame = self.cap.read()
+            if not ret:
+                time.sleep(0.01)
+                continue
+
+            # 隔点采样估计平均亮度，开销可以忽略
+            brightness = float(frame[::16, ::16].mean())
+
+            with self._cond:
+                if (self.light_change is not None and self._brightness is not None
+                        and abs(brightness - self._brightness) > self.light_change):
+                    print(f"检测到光照变化 ({self._brightness:.0f} -> {brightness:.0f})，等待曝光稳定")
+                    self._settle_left = self.settle_frames
+                self._brightness = brightness
+
+                if self._settle_left > 0:
+                    self._settle_left -= 1
+                    continue
+
+                self._frame = frame
+                self._seq += 1
+                self._cond.notify_all()
+
+    def read(self, timeout=2.0):
+        """返回 (ret, frame)：比上次取走的帧更新的最新一帧，超时返回 (False, None)"""
+        with self._cond:
+            ready = self._cond.wait_for(lambda: self._seq > self._read_seq or not self._running, timeout)
+            if not ready or not self._running or self._frame is None:
+                return False, None
+            self._read_seq = self._seq
+            return True, self._frame
+
+
+def configure_capture(cap, size=(1280, 720), fourcc=None):
+    """设置摄像头的像素格式与分辨率；V4L2 需先设置像素格式再设置分辨率，驱动会就近选择支持的分辨率
+
+    fourcc 为 None 时保持驱动默认格式；'MJPG' 由摄像头压缩，同样带宽下可用更高帧率，解码在 OpenCV 内完成
+    """
+    if fourcc:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+
+
+def zoom_capture_size(imgsz, zoom_factor=1.0, base=(1280, 720), align=16):
+    """变焦裁剪图直接送入推理时够用的最小采集分辨率 (宽, 高)：与 base 同宽高比，裁剪图长边不小于推理尺寸
+
+    letterbox 总会把裁剪图缩小到 imgsz，更高的采集分辨率只会在预处理时被丢掉；结果不超过 base，按 align 向上取整
+    """
+    w, h = base
+    scale = min(1.0, imgsz * zoom_factor / max(w, h))
+    return tuple(min(v, -(-int(v * scale) // align) * align) for v in (w, h))
+
+
+def parse_capture_size(text):
+    """命令行的采集分辨率：'auto'（按推理尺寸与变焦倍数选择）或 '宽x高'"""
+    if text == 'auto':
+        return text
+    try:
+        w, h = (int(v) for v in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"采集分辨率应为 auto 或 宽x高，实际为 {text}")
+    return w, h
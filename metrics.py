@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+class LatencyTracker:
+    """按名称记录最近 window 次耗时，计算滚动的 p50/p95/p99（毫秒）；各线程可同时记录"""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._samples = {}  # 名称 -> 最近的耗时（秒）
+        self._counts = {}  # 名称 -> 累计次数
+        self._ticks = {}  # 名称 -> 上一次 tick 的时刻
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            if name not in self._samples:
+                self._samples[name] = deque(maxlen=self.window)
+                self._counts[name] = 0
+            self._samples[name].append(seconds)
+            self._counts[name] += 1
+
+    def tick(self, name):
+        """记录距上一次同名 tick 的间隔，如主循环两次得到结果之间的周期"""
+        now = time.perf_counter()
+        with self._lock:
+            last = self._ticks.get(name)
+            self._ticks[name] = now
+        if last is not None:
+            self.record(name, now - last)
+
+    @contextmanager
+    def timer(self, name):
+        """with tracker.timer('inference'): ... 记录代码块的耗时"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def percentiles(self):
+        """返回 {名称: {'count', 'p50', 'p95', 'p99', 'max'}}，耗时单位为毫秒，按首次记录的顺序排列"""
+        with self._lock:
+            snapshot = {name: (np.array(samples), self._counts[name]) for name, samples in self._samples.items()}
+        result = {}
+        for name, (samples, count) in snapshot.items():
+            p50, p95, p99 = np.percentile(samples, (50, 95, 99)) * 1e3
+            result[name] = {
+                'count': count,
+                'p50': round(float(p50), 2),
+                'p95': round(float(p95), 2),
+                'p99': round(float(p99), 2),
+                'max': round(float(samples.max()) * 1e3, 2),
+            }
+        return result
+
+    def summary_line(self):
+        """生成紧凑的单行统计：名称 p50/p95/p99（毫秒）"""
+        return " | ".join(
+            f"{name} {p['p50']:.1f}/{p['p95']:.1f}/{p['p99']:.1f}ms" for name, p in self.percentiles().items()
+        )
+
+
+class MetricsServer:
+    """本机 HTTP 指标接口：GET /metrics 返回 JSON（各环节延迟分位数及 extra() 提供的其他统计）
+
+    默认只监听 127.0.0.1，在后台守护线程中运行，可用 curl http://127.0.0.1:<port>/metrics 查看
+    """
+
+    def __init__(self, tracker, port, host='127.0.0.1', extra=None):
+        self.tracker = tracker
+        self.extra = extra  # 返回附加统计字典的函数，如流水线各阶段统计
+        self.started = time.time()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = json.dumps(server.snapshot(), ensure_ascii=False, default=str).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 不在标准输出打印访问日志
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    def snapshot(self):
+        data = {'uptime_s': round(time.time() - self.started, 1), 'latency_ms': self.tracker.percentiles()}
+        if self.extra is not None:
+            try:
+                data.update(self.extra())
+            except Exception as e:
+                data['extra_error'] = str(e)
+        return data
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        print(f"指标接口已启动: http://{self._httpd.server_address[0]}:{self._httpd.server_address[1]}/metrics")
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,163 @@
+import queue
+import threading
+import time
+
+
+class BoundedQueue:
+    """有界队列：满时可选择丢弃最旧的元素（drop-oldest）或阻塞等待（反压）"""
+
+    def __init__(self, maxsize=2, drop_oldest=True):
+        self.drop_oldest = drop_oldest
+        self.dropped = 0  # 因队列满被丢弃的元素数
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, item, stop_event=None):
+        while True:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if self.drop_oldest:
+                    try:
+                        self._queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+                elif stop_event is not None and stop_event.is_set():
+                    return False
+
+    def get(self, timeout=None):
+        """取出一个元素，超时抛出 queue.Empty"""
+        return self._queue.get(timeout=timeout)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+class Stage:
+    """流水线中的一个阶段：独立线程从输入队列取数据，处理后放入输出队列（func 返回 None 时丢弃该项）"""
+
+    def __init__(self, name, func, in_queue, out_queue, interval=0.0):
+        self.name = name
+        self.func = func
+        self.in_queue = in_queue  # 为 None 时表示源阶段（如拍照），每次以 None 调用 func
+        self.out_queue = out_queue
+        self.interval = interval  # 源阶段两次产出之间的最小间隔（秒），也可以是返回间隔的函数
+
+        # 延迟计数器
+        self.count = 0
+        self.errors = 0
+        self.busy = 0.0  # 累计处理耗时
+        self.last = 0.0
+        self.max = 0.0
+        self.started = None
+        self._thread = None
+
+    def start(self, stop_event):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, args=(stop_event,), name=self.name, daemon=True)
+        self._thread.start()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def _run(self, stop_event):
+        while not stop_event.is_set():
+            t0 = time.perf_counter()
+            if self.in_queue is None:
+                item = None
+            else:
+                try:
+                    item = self.in_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+            t1 = time.perf_counter()
+            try:
+                output = self.func(item)
+            except Exception as e:
+                self.errors += 1
+                print(f"流水线阶段 {self.name} 出错: {e}")
+                output = None
+            dt = time.perf_counter() - t1
+
+            self.count += 1
+            self.busy += dt
+            self.last = dt
+            self.max = max(self.max, dt)
+
+            if output is not None:
+                self.out_queue.put(output, stop_event)
+
+            # 源阶段限速
+            interval = self.interval() if callable(self.interval) else self.interval
+            if self.in_queue is None and interval > 0:
+                remaining = interval - (time.perf_counter() - t0)
+                if remaining > 0:
+                    stop_event.wait(remaining)
+
+    def stats(self):
+        """返回本阶段的延迟统计（毫秒）与忙碌占比"""
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': self.busy / self.count * 1e3 if self.count else 0.0,
+            'last_ms': self.last * 1e3,
+            'max_ms': self.max * 1e3,
+            'busy': self.busy / elapsed if elapsed > 0 else 0.0,
+            'dropped': self.out_queue.dropped,
+            'queued': self.out_queue.qsize(),
+        }
+
+
+class Pipeline:
+    """多线程流水线：拍照/预处理、推理、后处理各占一个线程，阶段之间用有界队列连接，
+    使第 N+1 帧的拍摄与预处理和第 N 帧的推理并行进行"""
+
+    def __init__(self, maxsize=2, drop_oldest=True, source_interval=0.0):
+        self.maxsize = maxsize
+        self.drop_oldest = drop_oldest
+        self.source_interval = source_interval
+        self.stages = []
+        self._stop_event = threading.Event()
+
+    def add_stage(self, name, func):
+        """添加一个阶段，第一个阶段为源阶段；最后一个阶段的输出通过 get() 取出"""
+        in_queue = self.stages[-1].out_queue if self.stages else None
+        out_queue = BoundedQueue(self.maxsize, self.drop_oldest)
+        interval = self.source_interval if not self.stages else 0.0
+        self.stages.append(Stage(name, func, in_queue, out_queue, interval))
+        return self
+
+    def start(self):
+        self._stop_event.clear()
+        for stage in self.stages:
+            stage.start(self._stop_event)
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        for stage in self.stages:
+            stage.join(timeout=2.0)
+
+    def get(self, timeout=None):
+        """取出最后一个阶段的下一个输出，超时抛出 TimeoutError"""
+        try:
+            return self.stages[-1].out_queue.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"流水线在 {timeout} 秒内没有产出结果")
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def stats_line(self):
+        """生成紧凑的单行统计，忙碌占比最高的阶段即为吞吐瓶颈"""
+        parts = []
+        for name, s in self.stats().items():
+            part = f"{name} {s['avg_ms']:.1f}ms/{s['max_ms']:.1f}ms {s['busy'] * 100:.0f}%"
+            if s['dropped']:
+                part += f" drop={s['dropped']}"
+            parts.append(part)
+        return " | ".join(parts)
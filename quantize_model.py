@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import sys
+
+from export_model import load_val_frames
+from task_profile import load_profile
+
+
+def load_decoder(task, profile, yolov5_dir):
+    """返回与主程序完全相同的结果解码函数：变焦后帧的检测数组 + 帧尺寸 → 六位字符串（区域划分与解码见 task_profile.py）
+
+    类别名称取自 yolov5_dir 下的 data/coco.yaml（与主程序的 --yolov5-dir 相同）
+    """
+    if task == 'box':
+        import box_main as task_main
+    else:
+        import stack_main as task_main
+    names = task_main.load_class_names(yolov5_dir)
+    if task == 'box':
+        return lambda det, shape: profile.parse(det, names, (shape[1], shape[0]))[0]
+    return lambda det, shape: profile.parse(det, names)[0]  # 纸垛按归一化坐标划分区域
+
+
+def quantize(fp32_path, int8_path, detector, frames, per_channel=True):
+    """用校准帧对 FP32 ONNX 模型做静态 INT8 量化（QDQ 格式），并保留模型元数据（stride、names）"""
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = onnx.load(fp32_path, load_external_data=False).graph.input[0].name
+
+    class FrameCalibrationReader(CalibrationDataReader):
+        """按主程序相同的预处理（letterbox）逐帧提供校准输入"""
+
+        def __init__(self):
+            self.frames = iter(frames)
+
+        def get_next(self):
+            item = next(self.frames, None)
+            if item is None:
+                return None
+            return {input_name: detector.preprocess(item[1]).cpu().numpy()}
+
+    quantize_static(
+        str(fp32_path),
+        str(int8_path),
+        FrameCalibrationReader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=per_channel,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+    # DetectMultiBackend 从 ONNX 元数据中读取 stride 和 names
+    fp32_model = onnx.load(fp32_path)
+    int8_model = onnx.load(int8_path)
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, int8_path)
+
+
+def accuracy_gate(reference, candidate, decode, frames):
+    """在留出集上对比 FP32 与 INT8 的最终六位字符串，返回报告字典"""
+    differences = []
+    for name, frame in frames:
+        ref_str = decode(reference(frame), frame.shape)
+        out_str = decode(candidate(frame), frame.shape)
+        if ref_str != out_str:
+            differences.append({'frame': name, 'fp32': ref_str, 'int8': out_str})
+    return {
+        'frames': len(frames),
+        'differences': differences,
+        'mismatch_rate': len(differences) / max(len(frames), 1),
+    }
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="INT8 训练后量化，并以最终六位字符串的一致率作为准入门槛")
+    parser.add_argument('--task', choices=['box', 'stack'], required=True,
+                        help="box 或 stack，默认的目录、权重与尺寸取自同名任务配置")
+    parser.add_argument('--weights', default=None, help="PyTorch 权重路径，默认使用任务配置中的权重")
+    parser.add_argument('--imgsz', type=int, default=None, help="推理尺寸，默认使用任务配置中的尺寸")
+    parser.add_argument('--yolov5-dir', default=None, help="yolov5-master 目录，默认使用任务配置中的目录")
+    parser.add_argument('--calib-dir', required=True, help="校准集图片目录（现场采集的帧）")
+    parser.add_argument('--holdout-dir', required=True, help="留出集图片目录，不能与校准集重复")
+    parser.add_argument('--max-mismatch', type=float, default=0.0, help="允许的最终字符串不一致比例，超过则拒绝 INT8 模型")
+    parser.add_argument('--per-tensor', action='store_true', help="按张量而不是按通道量化权重")
+    return parser.parse_args()
+
+
+def main(opt):
+    profile = load_profile(opt.task)
+    yolov5_dir = opt.yolov5_dir or profile.yolov5_dir
+    weights = opt.weights or profile.weights
+    imgsz = opt.imgsz or profile.imgsz
+
+    # 本仓库的 box_detect.py / stack_detect.py 部署为 yolov5-master/detect.py
+    sys.path.insert(0, yolov5_dir)
+    from detect import VERIFIED_SUFFIX, Detector, export_path
+
+    fp32_path = export_path(weights, 'onnx')
+    if not os.path.exists(fp32_path):
+        raise FileNotFoundError(f"未找到 FP32 ONNX 模型: {fp32_path}，请先运行 export_model.py --backend onnx")
+    int8_path = export_path(weights, 'int8')
+    marker = f"{int8_path}{VERIFIED_SUFFIX}"
+    if os.path.exists(marker):
+        os.remove(marker)  # 重新量化前先撤销旧的可用标记
+
+    calib_frames = load_val_frames(opt.calib_dir)
+    holdout_frames = load_val_frames(opt.holdout_dir)
+    if not calib_frames or not holdout_frames:
+        raise RuntimeError("校准集或留出集目录中没有图片")
+    # 与主程序相同，校准与准确率门槛都在数码变焦后的帧上进行（区域边界是在变焦后的画面上标定的）
+    calib_frames = [(name, profile.zoom(frame)) for name, frame in calib_frames]
+    holdout_frames = [(name, profile.zoom(frame)) for name, frame in holdout_frames]
+
+    fp32_onnx = Detector(weights=fp32_path, imgsz=(imgsz, imgsz), device='cpu')
+    quantize(fp32_path, int8_path, fp32_onnx, calib_frames, per_channel=not opt.per_tensor)
+    print(f"INT8 模型已生成: {int8_path}")
+
+    # 以 PyTorch FP32 模型为基准，走与主程序相同的区域划分与去重补全流程
+    reference = Detector(weights=weights, imgsz=(imgsz, imgsz), backend='pt', device='cpu')
+    candidate = Detector(weights=int8_path, imgsz=(imgsz, imgsz), device='cpu')
+    report = accuracy_gate(reference, candidate, load_decoder(opt.task, profile, yolov5_dir), holdout_frames)
+    report.update({
+        'weights': str(weights),
+        'artifact': str(int8_path),
+        'fp32_speed_ms': [round(dt.t / len(holdout_frames) * 1e3, 1) for dt in reference.dt],
+        'int8_speed_ms': [round(dt.t / len(holdout_frames) * 1e3, 1) for dt in candidate.dt],
+    })
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if report['mismatch_rate'] <= opt.max_mismatch:
+        # 写入可用标记后，Detector(backend='auto') 会优先使用 INT8 模型
+        with open(marker, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"准确率门槛通过，已写入 {marker}")
+    else:
+        print(f"INT8 模型被拒绝：不一致比例 {report['mismatch_rate']:.3f} > {opt.max_mismatch}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(parse_opt())
@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def region_mask(det, region_bounds, img_size=(1, 1), closed=True, exclusive=False):
+    """一次性计算检测框与区域的归属矩阵，返回 (N, 区域数) 的布尔数组
+
+    det 为检测数组 (N, 6)：归一化 xywh、置信度、类别；以框中心点判断是否落在区域
+    (x_min, x_max, y_min, y_max) 内。img_size 为 (宽, 高)，给定时在像素坐标下比较；
+    closed 为 True 时区域右、下边界也算在内；exclusive 为 True 时每个框只归属第一个匹配的区域
+    """
+    det = np.asarray(det, dtype=np.float64).reshape(-1, 6)
+    bounds = np.asarray(region_bounds, dtype=np.float64).reshape(-1, 4)
+    img_w, img_h = img_size
+
+    cx = det[:, 0:1] * img_w
+    cy = det[:, 1:2] * img_h
+    x_min, x_max = bounds[:, 0] * img_w, bounds[:, 1] * img_w
+    y_min, y_max = bounds[:, 2] * img_h, bounds[:, 3] * img_h
+
+    if closed:
+        mask = (x_min <= cx) & (cx <= x_max) & (y_min <= cy) & (cy <= y_max)
+    else:
+        mask = (x_min <= cx) & (cx < x_max) & (y_min <= cy) & (cy < y_max)
+    if exclusive:
+        mask &= np.cumsum(mask, axis=1) == 1
+    return mask
+
+
+def assign_regions(det, region_bounds, img_size=(1, 1), closed=True, exclusive=False, select='leftmost'):
+    """为每个区域选出一个检测框，返回 (区域数,) 的行号数组，区域内没有框时为 -1
+
+    select 为 'leftmost' 时取框左边界最小者（相同时取靠前的行）；
+    为 'conf' 时取置信度最高者（相同时取靠后的行，与检测数组按置信度升序逐行覆盖的结果一致）
+    """
+    det = np.asarray(det, dtype=np.float64).reshape(-1, 6)
+    num_regions = len(region_bounds)
+    if not len(det):
+        return np.full(num_regions, -1, dtype=np.int64)
+
+    mask = region_mask(det, region_bounds, img_size, closed, exclusive)
+    if select == 'leftmost':
+        img_w = img_size[0]
+        key = det[:, 0] * img_w - det[:, 2] * img_w / 2
+        idx = np.where(mask, key[:, None], np.inf).argmin(axis=0)
+    elif select == 'conf':
+        # 行顺序翻转后取 argmax，使置信度相同时靠后的行胜出
+        idx = len(det) - 1 - np.where(mask, det[:, 4:5], -np.inf)[::-1].argmax(axis=0)
+    else:
+        raise ValueError(f"未知的选择方式: {select}")
+    return np.where(mask.any(axis=0), idx, -1)
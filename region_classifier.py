@@ -0,0 +1,217 @@
+import argparse
+import os
+import random
+from glob import glob
+
+import cv2
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+EMPTY = 'x'  # 区域内没有目标时的类别名，与主程序中未识别区域的占位符一致
+
+
+def class_list(names):
+    """YOLO 类别名（列表或 {id: name} 字典）加上 EMPTY，得到分类器的类别列表"""
+    return [str(names[i]) for i in range(len(names))] + [EMPTY]
+
+
+def crop_regions(frame, region_bounds, size=64, pad=0.0, jitter=0.0):
+    """按归一化区域边界裁剪六个区域并缩放为 size×size，返回 (6, size, size, 3) 的 BGR 数组
+
+    jitter 为训练时的随机平移比例（相对区域宽高），推理时为 0
+    """
+    h, w = frame.shape[:2]
+    patches = []
+    for x_min, x_max, y_min, y_max in region_bounds:
+        rw, rh = x_max - x_min, y_max - y_min
+        dx = random.uniform(-jitter, jitter) * rw if jitter else 0.0
+        dy = random.uniform(-jitter, jitter) * rh if jitter else 0.0
+        x1 = max(int((x_min - pad + dx) * w), 0)
+        x2 = min(int((x_max + pad + dx) * w), w)
+        y1 = max(int((y_min - pad + dy) * h), 0)
+        y2 = min(int((y_max + pad + dy) * h), h)
+        patch = frame[y1:y2, x1:x2]
+        if patch.size == 0:
+            patch = np.zeros((size, size, 3), dtype=frame.dtype)
+        patches.append(cv2.resize(patch, (size, size), interpolation=cv2.INTER_AREA))
+    return np.stack(patches)
+
+
+def to_tensor(patches):
+    """(N, H, W, 3) BGR uint8 → (N, 3, H, W) RGB float32，取值 0~1"""
+    x = torch.from_numpy(np.ascontiguousarray(patches[..., ::-1].transpose(0, 3, 1, 2)))
+    return x.float() / 255
+
+
+class RegionNet(nn.Module):
+    """轻量区域分类网络：四个卷积块 + 全局平均池化 + 全连接"""
+
+    def __init__(self, num_classes, width=32):
+        super().__init__()
+        layers = []
+        c_in = 3
+        for c_out in (width, width * 2, width * 4, width * 4):
+            layers += [
+                nn.Conv2d(c_in, c_out, 3, padding=1, bias=False),
+                nn.BatchNorm2d(c_out),
+                nn.ReLU(inplace=True),
+                nn.MaxPool2d(2),
+            ]
+            c_in = c_out
+        self.features = nn.Sequential(*layers)
+        self.fc = nn.Linear(c_in, num_classes)
+
+    def forward(self, x):
+        x = self.features(x)
+        return self.fc(F.adaptive_avg_pool2d(x, 1).flatten(1))
+
+
+def region_targets(label_path, names, profile):
+    """由 YOLO 标签生成每个区域的类别标签：按任务配置的区域归入规则（与主程序解析检测结果相同）选出目标，没有目标为 EMPTY
+
+    标签没有置信度，均按 1.0 计：取置信度最高（select: conf）的区域内有多个目标时取标签中靠后的一个
+    """
+    classes = class_list(names)
+    objects = []
+    if os.path.exists(label_path):
+        with open(label_path) as f:
+            for line in f:
+                parts = line.strip().split()
+                if len(parts) < 5:
+                    continue
+                class_id = int(parts[0])
+                if 0 <= class_id < len(names):
+                    objects.append([float(v) for v in parts[1:5]] + [1.0, class_id])
+
+    det = np.array(objects, dtype=np.float64).reshape(-1, 6)
+    return [int(det[i, 5]) if i >= 0 else classes.index(EMPTY) for i in profile.assign(det)]
+
+
+def load_dataset(data_dir, names, profile):
+    """读取 YOLO 格式数据集（images/ 与 labels/ 目录），返回 [(图片, 六个区域类别), ...]"""
+    samples = []
+    image_paths = sorted(glob(os.path.join(data_dir, 'images', '*')))
+    for path in image_paths:
+        frame = cv2.imread(path)
+        if frame is None:
+            continue
+        stem = os.path.splitext(os.path.basename(path))[0]
+        label_path = os.path.join(data_dir, 'labels', f"{stem}.txt")
+        samples.append((frame, region_targets(label_path, names, profile)))
+    return samples
+
+
+def augment(patches):
+    """随机亮度、对比度扰动（对应比赛现场的光照变化）"""
+    patches = patches.astype(np.float32)
+    alpha = np.random.uniform(0.6, 1.4, (len(patches), 1, 1, 1))
+    beta = np.random.uniform(-40, 40, (len(patches), 1, 1, 1))
+    return np.clip(patches * alpha + beta, 0, 255).astype(np.uint8)
+
+
+def train(data_dir, names, profile, save_path, imgsz=64, epochs=40, batch_size=64, lr=1e-3, val_ratio=0.1):
+    """用现有 YOLO 标注训练区域分类器（区域边界与归入规则取自任务配置），保存验证集准确率最高的模型"""
+    region_bounds = profile.region_bounds
+    samples = load_dataset(data_dir, names, profile)
+    if not samples:
+        raise RuntimeError(f"数据集中没有图片: {data_dir}")
+    random.shuffle(samples)
+    n_val = max(int(len(samples) * val_ratio), 1)
+    val_samples, train_samples = samples[:n_val], samples[n_val:] or samples
+
+    classes = class_list(names)
+    model = RegionNet(len(classes))
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, epochs)
+
+    # 验证集固定裁剪，不做增强
+    val_x = to_tensor(np.concatenate([crop_regions(f, region_bounds, imgsz) for f, _ in val_samples]))
+    val_y = torch.tensor([t for _, targets in val_samples for t in targets])
+
+    frames_per_batch = max(batch_size // len(region_bounds), 1)  # 每帧贡献六个区域样本
+    best_acc = -1.0
+    for epoch in range(epochs):
+        model.train()
+        random.shuffle(train_samples)
+        total_loss = 0.0
+        for i in range(0, len(train_samples), frames_per_batch):
+            batch = train_samples[i:i + frames_per_batch]
+            patches = [augment(crop_regions(f, region_bounds, imgsz, jitter=0.05)) for f, _ in batch]
+            x = to_tensor(np.concatenate(patches))
+            y = torch.tensor([t for _, targets in batch for t in targets])
+            loss = F.cross_entropy(model(x), y)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(y)
+        scheduler.step()
+
+        model.eval()
+        with torch.inference_mode():
+            acc = (model(val_x).argmax(1) == val_y).float().mean().item()
+        print(f"epoch {epoch + 1}/{epochs} loss {total_loss / (len(train_samples) * len(region_bounds)):.4f} "
+              f"val_acc {acc:.4f}")
+
+        if acc > best_acc:
+            best_acc = acc
+            torch.save({
+                'model': model.state_dict(),
+                'classes': classes,
+                'region_bounds': list(region_bounds),
+                'imgsz': imgsz,
+            }, save_path)
+    print(f"最佳验证准确率 {best_acc:.4f}，模型已保存到 {save_path}")
+
+
+class RegionClassifier:
+    """区域分类推理引擎：把六个区域裁剪后作为一个批次送入分类网络，返回每个区域的类别与置信度"""
+
+    def __init__(self, weights, threads=None):
+        ckpt = torch.load(weights, map_location='cpu')
+        self.classes = ckpt['classes']
+        self.region_bounds = ckpt['region_bounds']
+        self.imgsz = ckpt['imgsz']
+        self.model = RegionNet(len(self.classes))
+        self.model.load_state_dict(ckpt['model'])
+        self.model.eval()
+        if threads:
+            torch.set_num_threads(threads)
+
+    @torch.inference_mode()
+    def __call__(self, frame):
+        """返回 (六个区域的类别名列表, 对应置信度数组)；没有目标的区域类别为 EMPTY"""
+        x = to_tensor(crop_regions(frame, self.region_bounds, self.imgsz))
+        conf, idx = F.softmax(self.model(x), 1).max(1)
+        return [str(self.classes[i]) for i in idx.tolist()], conf.numpy()
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="用 YOLO 标注训练六区域分类器")
+    parser.add_argument('--task', choices=['box', 'stack'], required=True,
+                        help="box 或 stack，区域边界与归入规则取自同名任务配置")
+    parser.add_argument('--yolov5-dir', default=None,
+                        help="yolov5-master 目录（类别名称取自其中的 data/coco.yaml），默认使用任务配置中的目录")
+    parser.add_argument('--data', required=True, help="YOLO 格式数据集目录（含 images/ 与 labels/）")
+    parser.add_argument('--save', required=True, help="模型保存路径，如 region_cls_box.pt")
+    parser.add_argument('--imgsz', type=int, default=64, help="区域裁剪后的输入尺寸")
+    parser.add_argument('--epochs', type=int, default=40)
+    parser.add_argument('--batch-size', type=int, default=64)
+    return parser.parse_args()
+
+
+def main(opt):
+    from task_profile import load_profile
+
+    if opt.task == 'box':
+        import box_main as task_main
+    else:
+        import stack_main as task_main
+    profile = load_profile(opt.task)
+    names = task_main.load_class_names(opt.yolov5_dir or profile.yolov5_dir)
+    train(opt.data, names, profile, opt.save, opt.imgsz, opt.epochs, opt.batch_size)
+
+
+if __name__ == "__main__":
+    main(parse_opt())
@@ -0,0 +1,78 @@
+import argparse
+import json
+import sys
+from collections import Counter
+
+from constraint_decoder import DECODERS
+
+
+def load_records(path):
+    """读取解码日志（每行一个 JSON 记录），返回 [(文件:行号, 记录), ...]，跳过断电等原因造成的不完整行"""
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append((f"{path}:{line_no}", json.loads(line)))
+            except json.JSONDecodeError:
+                print(f"跳过无法解析的行 {path}:{line_no}")
+    return records
+
+
+def task_decoder(task, decoders):
+    """任务名 → 解码函数：box、stack 使用内置解码器，其他任务按同名任务配置（profiles/<任务名>.yaml）生成"""
+    if task not in decoders:
+        from task_profile import load_profile
+
+        decoders[task] = load_profile(task).decode
+    return decoders[task]
+
+
+def replay(records, seed=None):
+    """用当前的解码器重新解码每条记录，返回报告字典；seed 不为 None 时用该种子代替记录中的种子"""
+    differences = []
+    tasks = Counter()
+    decoders = dict(DECODERS)
+    for location, record in records:
+        tasks[record['task']] += 1
+        record_seed = record.get('seed') if seed is None else seed
+        decode = task_decoder(record['task'], decoders)
+        output = decode(record['chars'], record.get('confs'), record_seed)
+        if output != record['output']:
+            differences.append({
+                'location': location,
+                'task': record['task'],
+                'chars': record['chars'],
+                'logged': record['output'],
+                'replayed': output,
+            })
+    return {
+        'records': len(records),
+        'tasks': dict(tasks),
+        'differences': differences,
+    }
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="离线重放主程序的解码日志（--decode-log），检查解码器改动是否改变了输出")
+    parser.add_argument('logs', nargs='+', help="解码日志文件（JSON Lines）")
+    parser.add_argument('--seed', type=int, default=None, help="用指定种子代替日志中的种子重新解码")
+    parser.add_argument('--max-show', type=int, default=20, help="最多打印多少条不一致的记录")
+    return parser.parse_args()
+
+
+def main(opt):
+    records = [record for path in opt.logs for record in load_records(path)]
+    report = replay(records, opt.seed)
+    differences = report.pop('differences')
+    report['mismatches'] = len(differences)
+    report['examples'] = differences[:opt.max_show]
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if differences:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(parse_opt())
@@ -0,0 +1,114 @@
+import os
+import zlib
+
+
+def _line_checksum(result):
+    return f"{zlib.crc32(result.encode()):08x}"
+
+
+def _fsync_dir(path):
+    """rename 之后同步所在目录，保证新文件名本身落盘"""
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class ResultJournal:
+    """只追加的结果日志，替代每帧整文件重写的 results.txt
+
+    每个结果追加一行 `<结果> <crc32>` 并 fsync，每帧只写一小段；断电时最多丢失正在写的那一行，
+    load() 会丢弃 CRC 不匹配或不完整的行。每追加 compact_every 行压缩一次：把最近 maxlen 个结果写入临时文件、
+    fsync 后原子 rename 覆盖原文件，因此文件不超过 maxlen + compact_every 行，任何时刻断电都能恢复到完整的旧文件或新文件
+    """
+
+    def __init__(self, path, maxlen=40, compact_every=200, fsync=True):
+        self.path = path
+        self.maxlen = maxlen
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.recent = []  # 最近 maxlen 个结果，压缩时写入
+        self.appended = 0  # 上次压缩后追加的行数
+        self.dropped = 0  # load() 时丢弃的损坏行数
+        self._fd = None
+
+    def load(self):
+        """读取日志中最近 maxlen 个结果，并立即压缩（截掉损坏的尾部、转换旧格式）"""
+        results = []
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'rb') as f:
+                    data = f.read()
+                lines = data.split(b'\n')
+                # 最后一段没有换行符：写入被打断的行
+                if lines and lines[-1]:
+                    self.dropped += 1
+                for raw in lines[:-1]:
+                    result = self._parse_line(raw)
+                    if result is not None:
+                        results.append(result)
+                    elif raw.strip():
+                        self.dropped += 1
+                print(f"从结果日志加载了 {len(results[-self.maxlen:])} 个结果，丢弃损坏行 {self.dropped} 行")
+            except OSError as e:
+                print(f"加载结果失败: {e}")
+        self.recent = results[-self.maxlen:]
+        self.compact()
+        return list(self.recent)
+
+    @staticmethod
+    def _parse_line(raw):
+        try:
+            parts = raw.decode().split()
+        except UnicodeDecodeError:
+            return None
+        if len(parts) == 2 and _line_checksum(parts[0]) == parts[1]:
+            return parts[0]
+        if len(parts) == 1 and parts[0].isalnum():
+            return parts[0]  # 旧版 results.txt：每行一个结果，没有校验
+        return None
+
+    def append(self, result):
+        """追加一个结果；写入失败时只打印错误，下次追加时重新打开文件"""
+        result = str(result)
+        self.recent = (self.recent + [result])[-self.maxlen:]
+        try:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            os.write(self._fd, f"{result} {_line_checksum(result)}\n".encode())
+            if self.fsync:
+                os.fsync(self._fd)
+        except OSError as e:
+            print(f"保存结果失败: {e}")
+            self._close_fd()
+            return
+        self.appended += 1
+        if self.appended >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """把最近 maxlen 个结果写入临时文件并原子替换日志"""
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                f.writelines(f"{result} {_line_checksum(result)}\n" for result in self.recent)
+                f.flush()
+                os.fsync(f.fileno())
+            self._close_fd()
+            os.replace(tmp_path, self.path)
+            _fsync_dir(self.path)
+            self.appended = 0
+        except OSError as e:
+            print(f"压缩结果日志失败: {e}")
+
+    def _close_fd(self):
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def close(self):
+        self._close_fd()
@@ -0,0 +1,179 @@
+"""二进制串口帧（协议版本 1），替代 '7' 连接的 ASCII 字符串（版本 0）
+
+帧格式（共 16 字节，多字节字段为大端）：
+    偏移  长度  字段
+    0     2     同步头 0xA5 0x5A
+    2     1     协议版本，固定为 1
+    3     1     标志：bit0 任务（0 货箱 / 1 纸垛），bit1 结果已稳定（时间融合），bit2 本帧没有检测到任何目标
+    4     1     序号，每个新结果加一（0~255 循环），心跳重发时不变，可据此判断丢帧和重复帧
+    5     3     六个区域的结果，每个区域 4 位，区域 a 在最高位：1~6 为数字，0xA~0xF 为字母 a~f，0 为未知；
+                任务配置的区域少于六个时，其后的区域位置为 0（置信度也为 0）
+    8     6     六个区域的置信度，0~255 对应 0~1；由去重补全改写过的区域为 0
+    14    2     CRC-16/CCITT-FALSE（多项式 0x1021，初值 0xFFFF，不反转，无异或输出），覆盖偏移 2~13
+
+下位机可按 FrameParser 的流程解析：找同步头 → 取 16 字节 → 校验 CRC，失败则从下一个字节重新找同步头
+"""
+import argparse
+import struct
+
+SYNC = b'\xa5\x5a'
+VERSION = 1
+FRAME_SIZE = 16
+FLAG_STACK = 0x01
+FLAG_STABLE = 0x02
+FLAG_EMPTY = 0x04
+TASKS = ('box', 'stack')
+
+
+def crc16_ccitt(data, crc=0xFFFF):
+    """CRC-16/CCITT-FALSE"""
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    return crc
+
+
+def char_to_nibble(char):
+    if char in '123456':
+        return int(char)
+    if char in 'abcdef':
+        return 0xA + 'abcdef'.index(char)
+    return 0
+
+
+def nibble_to_char(nibble):
+    if 1 <= nibble <= 6:
+        return str(nibble)
+    if 0xA <= nibble <= 0xF:
+        return 'abcdef'[nibble - 0xA]
+    return 'x'
+
+
+def region_confidences(result, region_votes):
+    """六个区域输出字符对应的识别置信度：输出与该区域的识别结果一致时取其置信度，被去重补全改写的区域为 0
+
+    region_votes 为六个区域的 (字符, 置信度)，未识别到的区域为 None 或字符为 'x'；字母不区分具体是哪个字母
+    """
+    confs = []
+    for char, vote in zip(result, region_votes):
+        if vote is None or vote[0] == 'x':
+            confs.append(0.0)
+        elif vote[0] == char or (vote[0] in 'abcdef' and char in 'abcdef'):
+            confs.append(float(vote[1]))
+        else:
+            confs.append(0.0)
+    return confs
+
+
+def encode_frame(task, result, confs, seq, stable=False, num_regions=6):
+    """把一个结果打包为 16 字节的帧；result 不是 num_regions 个字符（如纸垛的 "error"）时各区域为未知并置 FLAG_EMPTY
+
+    num_regions 为任务的区域数（1~6），不足六个区域时其后的位置补为未知
+    """
+    flags = FLAG_STACK if task == 'stack' else 0
+    if stable:
+        flags |= FLAG_STABLE
+    if len(result) != num_regions:
+        result, confs = '', []
+        flags |= FLAG_EMPTY
+    result = result + 'x' * (6 - len(result))
+    confs = list(confs) + [0.0] * (6 - len(confs))
+
+    packed = 0
+    for char in result:
+        packed = (packed << 4) | char_to_nibble(char)
+    conf_bytes = bytes(min(max(int(round(float(c) * 255)), 0), 255) for c in confs)
+    body = struct.pack('>BBB', VERSION, flags, seq & 0xFF) + packed.to_bytes(3, 'big') + conf_bytes
+    return SYNC + body + struct.pack('>H', crc16_ccitt(body))
+
+
+def decode_frame(frame):
+    """解析一个完整的帧，返回字典；格式或 CRC 错误时抛出 ValueError"""
+    if len(frame) != FRAME_SIZE or frame[:2] != SYNC:
+        raise ValueError("帧长度或同步头错误")
+    body, (crc,) = frame[2:-2], struct.unpack('>H', frame[-2:])
+    if crc16_ccitt(body) != crc:
+        raise ValueError("CRC 校验失败")
+    version, flags, seq = struct.unpack('>BBB', body[:3])
+    if version != VERSION:
+        raise ValueError(f"不支持的协议版本: {version}")
+    packed = int.from_bytes(body[3:6], 'big')
+    result = ''.join(nibble_to_char((packed >> (4 * (5 - i))) & 0xF) for i in range(6))
+    return {
+        'task': TASKS[flags & FLAG_STACK],
+        'stable': bool(flags & FLAG_STABLE),
+        'empty': bool(flags & FLAG_EMPTY),
+        'seq': seq,
+        'result': 'error' if flags & FLAG_EMPTY else result,
+        'confs': [b / 255 for b in body[6:12]],
+    }
+
+
+class FrameEncoder:
+    """主程序使用的编码器：每个新结果分配一个序号并打包成帧"""
+
+    def __init__(self, task, num_regions=6):
+        self.task = task
+        self.num_regions = num_regions  # 任务配置的区域数
+        self.seq = 0
+
+    def __call__(self, result, region_votes, stable=False):
+        confs = region_confidences(result, region_votes)
+        frame = encode_frame(self.task, result, confs, self.seq, stable, self.num_regions)
+        self.seq = (self.seq + 1) & 0xFF
+        return frame
+
+
+class FrameParser:
+    """接收端的流式解析：feed() 接收任意切分的字节流，返回其中完整且校验通过的帧，自动跳过噪声重新同步"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.errors = 0  # 同步头正确但 CRC 等校验失败的次数
+
+    def feed(self, data):
+        self.buffer.extend(data)
+        frames = []
+        while True:
+            start = self.buffer.find(SYNC)
+            if start < 0:
+                del self.buffer[:-1]  # 保留可能是半个同步头的最后一个字节
+                break
+            del self.buffer[:start]
+            if len(self.buffer) < FRAME_SIZE:
+                break
+            try:
+                frames.append(decode_frame(bytes(self.buffer[:FRAME_SIZE])))
+                del self.buffer[:FRAME_SIZE]
+            except ValueError:
+                self.errors += 1
+                del self.buffer[:1]
+        return frames
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser(description="读取串口（或模拟模式的虚拟串口）并打印解析出的二进制帧")
+    parser.add_argument('port', help="串口设备，如 /dev/ttyUSB0 或模拟模式打印的 /dev/pts/N")
+    parser.add_argument('--baudrate', type=int, default=115200)
+    return parser.parse_args()
+
+
+def main(opt):
+    import serial
+
+    ser = serial.Serial(opt.port, opt.baudrate, timeout=1)
+    frame_parser = FrameParser()
+    try:
+        while True:
+            for frame in frame_parser.feed(ser.read(ser.in_waiting or 1)):
+                print(frame)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ser.close()
+
+
+if __name__ == "__main__":
+    main(parse_opt())
@@ -0,0 +1,102 @@
+import threading
+import time
+
+
+def encode_line(message):
+    """默认的串口报文：字符串加换行"""
+    return message.encode() + b'\n'
+
+
+class ResultPublisher:
+    """结果发布与串口发送：主循环 publish() 新结果后发送线程立即被唤醒写串口，
+    结果没有变化时每 heartbeat 秒重发一次；用条件变量保护当前结果，替代全局变量加 sleep(1) 轮询
+
+    ser 为 None（串口打开失败）时只保存结果，不启动发送线程
+    """
+
+    def __init__(self, ser, heartbeat=1.0, min_interval=0.0, encode=encode_line, tracker=None, on_first_write=None):
+        self.ser = ser
+        self.heartbeat = heartbeat  # 结果不变时的重发间隔（秒）
+        self.min_interval = min_interval  # 两次写入之间的最小间隔（秒），限制结果频繁变化时的发送速率
+        self.encode = encode  # 结果 → 串口字节
+        self.tracker = tracker  # LatencyTracker，记录串口写入耗时与 publish 到写入的延迟
+        self.on_first_write = on_first_write  # 第一次成功写入串口后调用（无参数），用于记录启动耗时
+        self.sent = 0
+        self._cond = threading.Condition()
+        self._message = None
+        self._published_at = 0.0
+        self._version = 0  # 每次 publish 加一
+        self._sent_version = 0
+        self._running = False
+        self._thread = None
+
+    @property
+    def current(self):
+        with self._cond:
+            return self._message
+
+    def publish(self, message):
+        """发布新结果并唤醒发送线程"""
+        with self._cond:
+            self._message = message
+            self._published_at = time.perf_counter()
+            self._version += 1
+            self._cond.notify_all()
+
+    def start(self):
+        if self.ser is None:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="serial", daemon=True)
+        self._thread.start()
+        print("串口发送线程已启动")
+        return self
+
+    def stop(self, timeout=2.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def _run(self):
+        last_write = 0.0
+        while True:
+            with self._cond:
+                # 等到有新结果或心跳到期（还没有结果时只等新结果）
+                heartbeat_left = self.heartbeat - (time.perf_counter() - last_write)
+                self._cond.wait_for(
+                    lambda: not self._running or (self._message is not None and self._version != self._sent_version),
+                    timeout=self.heartbeat if self._message is None else max(heartbeat_left, 0.0),
+                )
+                if not self._running:
+                    break
+                if self._message is None:
+                    continue
+                message, version, published_at = self._message, self._version, self._published_at
+
+            # 限速：距上次写入不足 min_interval 时等待（期间到达的新结果会在下一轮发送）
+            wait = self.min_interval - (time.perf_counter() - last_write)
+            if wait > 0:
+                time.sleep(wait)
+
+            try:
+                t0 = time.perf_counter()
+                self.ser.write(self.encode(message))
+                last_write = time.perf_counter()
+            except Exception as e:
+                print(f"串口发送错误: {e}")
+                with self._cond:
+                    self._cond.wait_for(lambda: not self._running, timeout=2.0)  # 出错后等待2秒再重试
+                continue
+
+            if self.tracker is not None:
+                self.tracker.record('serial', last_write - t0)
+                if version != self._sent_version:
+                    self.tracker.record('publish_to_serial', last_write - published_at)
+            self._sent_version = version
+            self.sent += 1
+            if self.sent == 1 and self.on_first_write is not None:
+                self.on_first_write()
+            print(f"已发送: {message.hex(' ') if isinstance(message, bytes) else message}")
+        print("串口发送线程停止")
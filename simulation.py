@@ -0,0 +1,173 @@
+import errno
+import os
+import select
+import threading
+import time
+import tty
+from collections import deque
+from glob import glob
+
+import cv2
+
+IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png', 'bmp')
+
+
+class SimulatedCamera:
+    """模拟摄像头：按设定帧率循环读取视频文件或图片目录
+
+    实现了主程序与 FrameGrabber 用到的 cv2.VideoCapture 接口（isOpened、read、set、get、release），
+    read() 像真实摄像头一样阻塞到下一帧的时刻；set() 设置的分辨率会把帧缩放到该尺寸
+    """
+
+    def __init__(self, source, fps=15.0, loop=True):
+        self.source = source
+        self.fps = fps
+        self.loop = loop
+        self._size = None  # 由 set(CAP_PROP_FRAME_WIDTH/HEIGHT) 设置的输出尺寸 (宽, 高)
+        self._next = time.monotonic()
+        self._index = 0
+        self._video = None
+        self._paths = []
+        if os.path.isdir(source):
+            self._paths = sorted(p for ext in IMAGE_EXTENSIONS for p in glob(os.path.join(source, f"*.{ext}")))
+        else:
+            self._video = cv2.VideoCapture(source)
+
+    def isOpened(self):
+        return bool(self._paths) or (self._video is not None and self._video.isOpened())
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            self._size = (int(value), self._size[1] if self._size else 0)
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            self._size = (self._size[0] if self._size else 0, int(value))
+        elif prop == cv2.CAP_PROP_FPS:
+            self.fps = float(value)
+        else:
+            return False
+        return True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if self._size and prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self._size[0]
+        if self._size and prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self._size[1]
+        return self._video.get(prop) if self._video is not None else 0.0
+
+    def _next_frame(self):
+        if self._video is not None:
+            ret, frame = self._video.read()
+            if not ret and self.loop:
+                self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = self._video.read()
+            return ret, frame
+
+        if self._index >= len(self._paths):
+            if not self.loop:
+                return False, None
+            self._index = 0
+        frame = cv2.imread(self._paths[self._index])
+        self._index += 1
+        return frame is not None, frame
+
+    def read(self):
+        # 按帧率节拍阻塞，处理跟不上时不累积欠账
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+        self._next = max(self._next, now) + 1.0 / self.fps
+
+        ret, frame = self._next_frame()
+        if ret and self._size and all(self._size) and (frame.shape[1], frame.shape[0]) != self._size:
+            frame = cv2.resize(frame, self._size, interpolation=cv2.INTER_AREA)
+        return ret, frame
+
+    def release(self):
+        if self._video is not None:
+            self._video.release()
+        self._paths = []
+
+
+class MemorySerial:
+    """内存串口：记录每次写入的 (时间, 数据)，实现了主程序用到的 serial.Serial 接口（write、flush、is_open、close）"""
+
+    def __init__(self, maxlen=1000):
+        self.messages = deque(maxlen=maxlen)
+        self.bytes_written = 0
+        self.is_open = True
+        self.port = "memory"
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        with self._lock:
+            self.messages.append((time.time(), bytes(data)))
+            self.bytes_written += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+class PtySerial:
+    """伪终端串口：数据写入 pty 主端，其他程序（如下位机模拟器、`cat <port>`）打开从端 port 即可读取
+
+    没有读取方时 pty 缓冲区写满后丢弃数据（计入 dropped），不会阻塞发送线程；
+    其他程序写入从端的数据（如切换任务的命令）可用 readline() 读取
+    """
+
+    def __init__(self):
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+        self.bytes_written = 0
+        self.dropped = 0
+        self.is_open = True
+        self._rx = b''  # 已读取但还没有凑成一行的数据
+        print(f"虚拟串口已创建: {self.port}")
+
+    def readline(self, timeout=1.0):
+        """读取其他程序写入从端的一行（如 `echo stack > <port>`），超时返回已读到的部分"""
+        deadline = time.monotonic() + timeout
+        while b'\n' not in self._rx:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.is_open:
+                break
+            if not select.select([self._master], [], [], remaining)[0]:
+                break
+            try:
+                self._rx += os.read(self._master, 256)
+            except BlockingIOError:
+                continue
+        line, sep, self._rx = self._rx.partition(b'\n')
+        return line + sep
+
+    def write(self, data):
+        try:
+            written = os.write(self._master, data)
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+            written = 0
+        self.bytes_written += written
+        self.dropped += len(data) - written
+        return written
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            os.close(self._master)
+            os.close(self._slave)
+
+
+def open_simulated_serial(kind):
+    """按类型创建模拟串口：'memory' 或 'pty'"""
+    return PtySerial() if kind == 'pty' else MemorySerial()
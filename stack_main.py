@@ -1,73 +1,88 @@
+import argparse
 import cv2
-import time
 import os
-import subprocess
-import yaml
-import shutil
+import sys
 from glob import glob
-import serial
 from collections import deque
 
+from adaptive_scheduler import AdaptiveScheduler, SceneChangeGate
+from cold_start import StartupTimeline, existing_cameras, run_startup_tasks
+from frame_grabber import FrameGrabber, configure_capture, parse_capture_size, zoom_capture_size
+from metrics import LatencyTracker, MetricsServer
+from constraint_decoder import DecodeLog
+from serial_protocol import FrameEncoder
+from serial_publisher import ResultPublisher, encode_line
+from result_journal import ResultJournal
+from simulation import SimulatedCamera, open_simulated_serial
+from task_profile import load_profile
+from temporal_fusion import TemporalVoter
+
 # 配置路径
-YOLOV5_DIR = "/home/pi2/yolo/yolov5-master"
 OUTPUT_DIR = "/home/pi2/yolo/outcome"
-TEMP_DIR = os.path.join(YOLOV5_DIR, "temp_image")
-os.makedirs(TEMP_DIR, exist_ok=True)
 
-# 结果文件路径
-RESULT_FILE = os.path.join(OUTPUT_DIR, "results.txt")
+# 任务配置（profiles/stack.yaml）：模型权重与推理尺寸、拍照间隔、数码变焦、六个区域的边界、
+# 字母与数字的补全规则、时间融合参数，可用 --profile 换成其他 yaml 文件，新的场地布局不必修改本脚本
+PROFILE = 'stack'
+
+# 常驻检测器：本仓库的 stack_detect.py 部署为 yolov5-master/detect.py（目录见任务配置的 model.yolov5_dir），
+# 需使用 /home/pi2/PycharmProjects/stack_test/.venv/bin/python 运行本脚本；
+# detect（torch）、yaml、serial 在用到时才导入，缩短开机后到打开摄像头的时间
+
+# 调试输出：为True时把每帧图片和标签写入输出目录（--output-dir）下的 detections，正常运行时不落盘
+DEBUG_OUTPUT = False
+# 调试输出的环形缓冲槽数：1 表示始终覆盖同一组文件，循环中不删除任何目录
+DEBUG_SLOTS = 1
+
+# 流水线配置（队列长度与反压见 task_profile.py，拍照间隔见任务配置）：取结果超时（秒）、每隔多少帧打印一次各阶段延迟
+PIPELINE_TIMEOUT = 10.0
+STATS_INTERVAL = 10
+
+# 摄像头采集配置：分辨率 (宽, 高) 与像素格式（None 为驱动默认，'MJPG' 为摄像头端压缩）
+CAPTURE_SIZE = (1280, 720)
+CAPTURE_FOURCC = None
+
+# 感兴趣区域（ROI）推理：None 为整帧推理；'each' 把六个区域分别裁剪后成批推理；
+# 'union' 只对六个区域的外接矩形推理。裁剪图不放大，只补边到 ROI_IMGSZ
+ROI_IMGSZ = {'each': 256, 'union': 1280}
+ROI_PAD = 0.02  # 裁剪时向外扩展的边距（归一化）
+
+# 自适应调度配置：结果连续相同多少次后降速/暂停、降速后的推理间隔、暂停后的确认间隔、
+# 判定场景变化的区域帧差阈值（0~255 灰度平均绝对差）；确认间隔需小于 PIPELINE_TIMEOUT
+ADAPTIVE_STABLE_AFTER = 5
+ADAPTIVE_PAUSE_AFTER = 20
+ADAPTIVE_SLOW_INTERVAL = 2.0
+ADAPTIVE_RECHECK_INTERVAL = 8.0
+ADAPTIVE_CHANGE_THRESHOLD = 12.0
+
+# 画面未变时跳过推理：与上一次推理帧的区域帧差不超过该阈值时复用上一次结果，最多连续复用多少帧
+SCENE_CHANGE_THRESHOLD = 4.0
+SCENE_MAX_REUSE = 30
+
+# 串口发送配置：结果变化时立即发送，不变时每 SERIAL_HEARTBEAT 秒重发一次；两次发送之间至少间隔 SERIAL_MIN_INTERVAL 秒
+SERIAL_HEARTBEAT = 1.0
+SERIAL_MIN_INTERVAL = 0.0
+# 串口协议版本：0 为 '7' 连接的六个结果字符串，1 为带序号、置信度和 CRC 的 16 字节二进制帧（见 serial_protocol.py）
+SERIAL_PROTOCOL = 0
+
+# 结果日志（输出目录下的文件名取自任务配置的 output.journal，与 dual_main.py 相同）：每帧追加一行并 fsync，
+# 每 RESULT_COMPACT_EVERY 帧压缩为最近 40 个结果（原子替换），断电后可恢复
+RESULT_COMPACT_EVERY = 200
 
 # 全局变量
 result_queue = deque(maxlen=40)  # 存储最近40个结果
-current_long_string = ""  # 当前的长字符串
-serial_active = True  # 串口发送控制标志
-
-
-def apply_digital_zoom(frame, zoom_factor=1, center_x=0.5, center_y=0.65):
-    """应用数码变焦"""
-    h, w = frame.shape[:2]
-    crop_w = int(w / zoom_factor)
-    crop_h = int(h / zoom_factor)
-
-    # 计算中心点坐标
-    cx = int(w * center_x)
-    cy = int(h * center_y)
-
-    # 计算裁剪区域
-    x1 = max(0, cx - crop_w // 2)
-    y1 = max(0, cy - crop_h // 2)
-    x2 = min(w, x1 + crop_w)
-    y2 = min(h, y1 + crop_h)
-
-    # 裁剪并缩放
-    cropped = frame[y1:y2, x1:x2]
-    return cv2.resize(cropped, (w, h), interpolation=cv2.INTER_LINEAR)
-
-
-def capture_single_image(cap, warmup_frames=3):
-    """拍摄单张图片"""
-    # 预热几帧
-    for _ in range(warmup_frames):
-        cap.read()
-        time.sleep(0.1)
-
-    ret, frame = cap.read()
-    if not ret:
-        raise RuntimeError("摄像头读取失败")
-
-    # 应用数码变焦
-    zoom_frame = apply_digital_zoom(frame)
+metrics = LatencyTracker()  # 各环节耗时的滚动分位数统计
+profile = None  # 任务配置（由命令行参数 --profile 加载）
+completion_seed = None  # 随机补全的种子，None 为按固定优先级补全（由命令行参数设置）
+decode_log = None  # 解码日志，None 为不记录（由命令行参数设置）
+frame_encoder = None  # 二进制串口帧编码器，None 为发送长字符串（由命令行参数设置）
 
-    # 保存为固定文件名
-    image_path = os.path.join(TEMP_DIR, "temp.jpg")
-    cv2.imwrite(image_path, zoom_frame)
-    return image_path
 
-
-def load_class_names():
-    """加载类别名称"""
+def load_class_names(yolov5_dir):
+    """从 yolov5 目录下的 data/coco.yaml 加载类别名称"""
     try:
-        with open(os.path.join(YOLOV5_DIR, "data", "coco.yaml")) as f:
+        import yaml
+
+        with open(os.path.join(yolov5_dir, "data", "coco.yaml")) as f:
             data = yaml.safe_load(f)
             return data['names']
     except Exception as e:
@@ -75,310 +90,69 @@ def load_class_names():
         return []  # 返回空列表避免后续错误
 
 
-def get_norepeat_string(result_chars):
-    # 辅助函数：移除重复（处理字符列表）
-    def remove_duplicates(chars):
-        # 获取所有数字字符
-        digits = [char for char in chars if char.isdigit()]
-
-        # 当存在重复数字时循环处理
-        while len(digits) != len(set(digits)):
-            found = False
-            # 按指定顺序遍历位置
-            for idx in [1, 5, 0, 2, 3, 4]:
-                if idx >= len(chars) or chars[idx].isalpha():
-                    continue  # 跳过字母位置
-
-                # 检查当前数字是否重复
-                if chars.count(chars[idx]) > 1:
-                    # 获取已存在的数字集合
-                    existing_digits = set(d for d in chars if d.isdigit())
-                    # 按优先级查找可替换的数字
-                    for candidate in ['6', '4', '5', '1', '2', '3']:
-                        if candidate not in existing_digits:
-                            chars[idx] = candidate
-                            found = True
-                            break
-                    if found:
-                        break
-
-            # 更新数字列表
-            digits = [char for char in chars if char.isdigit()]
-            if not found:
-                break
-
-        return chars
-
-    # 主处理逻辑
-    # 确保处理的是字符列表
-    chars = list(result_chars) if isinstance(result_chars, str) else result_chars[:]
-
-    # 统计字母数量
-    letter_count = sum(1 for char in chars if char.isalpha())
-
-    # 情况1：字母数量大于1
-    if letter_count > 1:
-        # 统计特定字母
-        count_abcdef = sum(1 for char in chars if char in 'abcdef')
-        count_x = chars.count('x')
-
-        if count_abcdef == 0 and count_x > 0:
-            # 情况：abcdef出现次数为0，先替换第一个x为字母
-            for i, char in enumerate(chars):
-                if char == 'x':
-                    # 位置映射：0->a, 1->b,...5->f，其他位置映射到a
-                    if i < 6:
-                        chars[i] = chr(ord('a') + i)
-                    else:
-                        chars[i] = 'a'
-                    count_abcdef += 1
-                    count_x -= 1
-                    letter_count = count_abcdef + count_x
-                    break
-
-        if letter_count > 1:
-            # 重新统计
-            count_abcdef = sum(1 for char in chars if char in 'abcdef')
-            count_x = chars.count('x')
-
-            # 按指定顺序查找字母位置
-            for idx in [1, 5, 0, 2, 3, 4]:
-                if idx >= len(chars):
-                    continue
-
-                # 情况1: 只存在1个abcdef字母 -> 只替换x
-                if count_abcdef == 1:
-                    if chars[idx] == 'x':
-                        # 获取已存在的数字集合
-                        existing_digits = set(char for char in chars if char.isdigit())
-                        # 按优先级选择替换数字
-                        for candidate in ['6', '4', '5', '1', '2', '3']:
-                            if candidate not in existing_digits:
-                                chars[idx] = candidate
-                                letter_count -= 1
-                                count_x -= 1
-                                break
-                        if letter_count <= 1:
-                            break
-
-                # 情况2/3: 存在0个或多个abcdef字母
-                else:
-                    # 优先替换x
-                    if chars[idx] == 'x':
-                        existing_digits = set(char for char in chars if char.isdigit())
-                        for candidate in ['6', '4', '5', '1', '2', '3']:
-                            if candidate not in existing_digits:
-                                chars[idx] = candidate
-                                letter_count -= 1
-                                count_x -= 1
-                                break
-                        if letter_count <= 1:
-                            break
-
-                    # 当没有x时再替换abcdef字母
-                    elif chars[idx] in 'abcdef' and count_x == 0:
-                        existing_digits = set(char for char in chars if char.isdigit())
-                        for candidate in ['6', '4', '5', '1', '2', '3']:
-                            if candidate not in existing_digits:
-                                chars[idx] = candidate
-                                letter_count -= 1
-                                count_abcdef -= 1
-                                break
-                        if letter_count <= 1:
-                            break
-
-    # 情况2：字母数量等于1
-    if letter_count == 1:
-        for i, char in enumerate(chars):
-            if char == 'x':
-                if i < 6:
-                    chars[i] = chr(ord('a') + i)
-                else:
-                    chars[i] = 'a'
-        chars = remove_duplicates(chars)
-
-    # 情况3：没有字母
-    elif letter_count == 0:
-        # 检查数字是否有重复
-        if len(set(chars)) == len(chars):
-            # 无重复：将第二个字符改为'b'
-            if len(chars) > 1:
-                chars[1] = 'b'
-        else:
-            # 有重复：按顺序查找第一个重复数字位置
-            for idx in [1, 5, 0, 2, 3, 4]:
-                if idx >= len(chars):
-                    continue
-
-                if chars.count(chars[idx]) > 1:
-                    # 将该位置替换为'b'
-                    chars[idx] = 'b'
-                    break
-            chars = remove_duplicates(chars)
-
-    return chars
-
-
-def get_detected_string(label_path, names):
-    """从单个标签文件获取检测结果字符串"""
-    if not label_path or not os.path.exists(label_path):
-        return "error"
-
-    try:
-        # 定义六个区域的边界（x_min, x_max, y_min, y_max）
-        # 根据您的实际需求调整这些值
-        region_bounds = [
-            # 区域 a
-            (0, 0.1, 0.5, 0.764),
-            # 区域 b
-            (0.133, 0.234, 0.222, 0.402),
-            # 区域 c
-            (0.289, 0.406, 0.22, 0.417),
-            # 区域 d
-            (0.46, 0.587, 0.194, 0.403),
-            # 区域 e
-            (0.625, 0.738, 0.167, 0.33),
-            # 区域 f
-            (0.728, 0.89, 0.44, 0.68)
-        ]
-        # 初始化区域检测结果
-        region_detected = [False] * 6
-        region_chars = [''] * 6
-
-        # 读取所有检测结果并解析坐标
-        with open(label_path) as f:
-            for line in f:
-                parts = line.strip().split()
-                if len(parts) < 5:
-                    continue
-                class_id = int(parts[0])
-                x_center = float(parts[1])
-                y_center = float(parts[2])
-
-                # 确保类别名称是字符串
-                class_name = str(names[class_id]) if class_id < len(names) else str(class_id)
-
-                # 检查检测结果是否在任一区域内
-                for i, (x_min, x_max, y_min, y_max) in enumerate(region_bounds):
-                    if (x_min <= x_center < x_max) and (y_min <= y_center < y_max):
-                        region_detected[i] = True
-                        region_chars[i] = class_name
-                        # 找到匹配区域后跳出循环
-                        break
-
-        # 生成最终字符列表
-        result_chars = []
-        for i in range(6):
-            if region_detected[i]:
-                detected_char = region_chars[i]
-                # 只接受字母a-f或数字1-6
-                if detected_char in 'abcdef123456':
-                    result_chars.append(detected_char)
-                else:
-                    result_chars.append(chr(ord('a') + i))
-            else:
-                result_chars.append('x')
-
-        # 处理重复问题
-        result_chars = get_norepeat_string(result_chars)
-        result = ''.join(result_chars)
-        return result
-
-    except Exception as e:
-        print(f"处理标签文件失败: {e}")
-        return "error"
-
-
-def run_yolo_detection(image_path):
-    """运行YOLOv5检测并返回标签路径"""
-    try:
-        # 清空输出目录
-        if os.path.exists(OUTPUT_DIR):
-            shutil.rmtree(OUTPUT_DIR)
-        os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-        # 运行检测
-        subprocess.run([
-            '/home/pi2/PycharmProjects/stack_test/.venv/bin/python',
-            '/home/pi2/yolo/yolov5-master/detect.py',
-            '--source', image_path,
-            '--project', OUTPUT_DIR,
-            '--name', 'detections',
-            '--exist-ok',
-            '--save-txt',
-            '--save-conf'
-        ], cwd=YOLOV5_DIR, check=True)
-
-        # 返回标签路径
-        return os.path.join(OUTPUT_DIR, "detections", "labels", "temp.txt")
-
-    except Exception as e:
-        print(f"YOLO检测失败: {e}")
-        return None
-
-
-def save_results_to_file():
-    """将结果队列保存到文件"""
-    try:
-        with open(RESULT_FILE, "w") as f:
-            for result in result_queue:
-                f.write(str(result) + "\n")  # 确保写入的是字符串
-    except Exception as e:
-        print(f"保存结果失败: {e}")
-
-
-def load_results_from_file():
-    """从文件加载结果队列"""
-    global result_queue
-    if os.path.exists(RESULT_FILE):
-        try:
-            with open(RESULT_FILE, "r") as f:
-                # 读取所有行，过滤空行，并确保是字符串
-                lines = [line.strip() for line in f.readlines() if line.strip()]
-                result_queue = deque(lines, maxlen=40)
-                print(f"从文件加载了 {len(lines)} 个结果")
-        except Exception as e:
-            print(f"加载结果失败: {e}")
-            result_queue = deque(maxlen=40)
-
-
-def serial_sending_thread(ser):
-    """串口发送线程函数"""
-    global current_long_string, serial_active
-
-    print("串口发送线程启动")
-    while serial_active:
-        try:
-            if current_long_string:
-                # 确保是字符串
-                message = str(current_long_string) + '\n'
-                ser.write(message.encode())
-                print(f"已发送: {message.strip()}")
-            time.sleep(1)  # 每秒发送一次
-        except Exception as e:
-            print(f"串口发送错误: {e}")
-            time.sleep(2)  # 出错后等待2秒再重试
-
-    print("串口发送线程停止")
-
-
-def main():
-    global current_long_string, serial_active, result_queue
-
-    # 确保输出目录存在
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-    # 尝试加载之前的结果
-    load_results_from_file()
-
-    # 初始化摄像头
+def fuse_result(voter, region_votes, fresh=True):
+    """把一帧的区域结果加入时间融合，返回 (融合并去重补全后的结果字符串, 是否稳定, 六个区域的融合 (字符, 置信度))
+
+    fresh 为 False（画面未变，复用上一次推理的结果）时不重复计票，只取当前的融合结果
+    """
+    chars, confs, stable = voter.update(region_votes) if fresh else voter.result()
+    return profile.decode(chars, confs, completion_seed, metrics, decode_log), stable, list(zip(chars, confs))
+
+
+def next_result(pipeline, voter=None, scheduler=None):
+    """从流水线取出下一帧结果；启用时间融合时返回融合结果，返回 (结果字符串, 是否稳定, 六个区域的 (字符, 置信度))"""
+    result_str, region_votes, fresh = pipeline.get(timeout=PIPELINE_TIMEOUT)
+    metrics.tick('cycle')
+    stable = False
+    if voter is not None:
+        fused_str, stable, region_votes = fuse_result(voter, region_votes, fresh)
+        print(f"单帧结果: {result_str} 融合结果: {fused_str} 稳定: {stable}")
+        result_str = fused_str
+    if scheduler is not None and fresh:
+        # 复用的结果不是新的观测，不计入连续相同结果的次数
+        scheduler.observe_result(result_str)
+    return result_str, stable, region_votes
+
+
+def serial_message(long_string, result_str, region_votes, stable):
+    """串口报文：协议版本 0 为长字符串，版本 1 为当前结果的二进制帧"""
+    if frame_encoder is None:
+        return long_string
+    return frame_encoder(result_str, region_votes, stable)
+
+
+def make_scheduler(fast_interval, voter=None):
+    """创建自适应调度器，场景变化时清空时间融合历史"""
+    return AdaptiveScheduler(
+        profile.region_bounds,
+        fast_interval=fast_interval,
+        slow_interval=ADAPTIVE_SLOW_INTERVAL,
+        recheck_interval=ADAPTIVE_RECHECK_INTERVAL,
+        stable_after=ADAPTIVE_STABLE_AFTER,
+        pause_after=ADAPTIVE_PAUSE_AFTER,
+        change_threshold=ADAPTIVE_CHANGE_THRESHOLD,
+        on_change=voter.reset if voter is not None else None,
+    )
+
+
+def open_camera(simulate=None, sim_fps=15.0, probe_existing=False, size=CAPTURE_SIZE, fourcc=CAPTURE_FOURCC,
+                output_dir=OUTPUT_DIR):
+    """打开摄像头（模拟模式下从视频文件或图片目录按帧率读取）并按 size、fourcc 设置采集格式，返回能读到画面的 cap
+
+    probe_existing 为 True 时跳过设备文件不存在的编号，不再逐个等待打开失败；全部失败时写入 output_dir/fail.txt 并抛出异常
+    """
     cap = None
-    for camera_index in ['/dev/my_camera', 0, 1, 2, 3, 4, 5]:
+    camera_indexes = [simulate] if simulate else ['/dev/my_camera', 0, 1, 2, 3, 4, 5]
+    if probe_existing and not simulate:
+        camera_indexes = existing_cameras(camera_indexes)
+    for camera_index in camera_indexes:
         try:
-            cap = cv2.VideoCapture(camera_index)
+            if simulate:
+                cap = SimulatedCamera(camera_index, fps=sim_fps)
+            else:
+                cap = cv2.VideoCapture(camera_index)
             if cap.isOpened():
-                cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+                configure_capture(cap, size, fourcc)
 
                 # 尝试读取一帧测试
                 ret, frame = cap.read()
@@ -391,19 +165,41 @@ def main():
 
     if cap is None or not cap.isOpened():
         # 所有尝试都失败
-        file_path = os.path.join(OUTPUT_DIR, "fail.txt")
+        file_path = os.path.join(output_dir, "fail.txt")
         with open(file_path, 'w') as file:
             file.write("无法打开摄像头")
         print(f"文件 {file_path} 已创建")
         raise RuntimeError("无法获取摄像头画面")
-
-    # 加载类别名称
-    names = load_class_names()
-
-    # 初始化串口
-    ser = None
+    return cap
+
+
+def load_models(opt):
+    """加载检测模型或区域分类器（只加载一次），返回 (detector, classifier)；torch 在此处才导入"""
+    if opt.engine == 'classifier':
+        from region_classifier import RegionClassifier
+        return None, RegionClassifier(opt.classifier_weights)
+    if opt.roi:
+        # 区域裁剪推理使用更小的输入尺寸；导出模型的输入尺寸固定为配置中的 imgsz，尺寸不同时只能用 PyTorch 权重
+        roi_imgsz = opt.roi_imgsz or ROI_IMGSZ[opt.roi]
+        backend = opt.backend or profile.backend
+        if roi_imgsz != profile.imgsz:
+            if backend not in ('auto', 'pt'):
+                raise ValueError(
+                    f"导出模型的输入尺寸固定为 {profile.imgsz}，不能用于 {roi_imgsz} 的 ROI 推理，请使用 --backend pt"
+                )
+            backend = 'pt'
+        return profile.load_detector(backend, opt.weights, roi_imgsz), None
+    return profile.load_detector(opt.backend, opt.weights), None
+
+
+def open_serial(simulate=False, sim_serial='memory'):
+    """初始化串口（模拟模式下使用虚拟串口），失败时返回 None（程序继续识别，只是不发送）"""
     try:
-        ser = serial.Serial(
+        if simulate:
+            return open_simulated_serial(sim_serial)
+        import serial
+
+        return serial.Serial(
             port='/dev/serial0',
             baudrate=115200,
             bytesize=serial.EIGHTBITS,
@@ -411,33 +207,187 @@ def main():
             stopbits=serial.STOPBITS_ONE,
             timeout=1
         )
-        # 启动串口发送线程
-        import threading
-        serial_thread = threading.Thread(target=serial_sending_thread, args=(ser,), daemon=True)
-        serial_thread.start()
-        print("串口发送线程已启动")
     except Exception as e:
         print(f"串口初始化失败: {e}")
-        ser = None
+        return None
 
-    try:
-        # 初始阶段：如果结果队列不足6个，拍摄照片直到有6个结果
-        while len(result_queue) < 6:
-            print(f"初始阶段: 已有 {len(result_queue)} 个结果，需要至少6个")
 
-            # 拍摄单张照片
-            image_path = capture_single_image(cap)
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--yolov5-dir', default=None,
+                        help="yolov5-master 目录（本仓库的检测文件部署为其中的 detect.py，类别名称取自其中的 data/coco.yaml），"
+                             "默认使用任务配置中的目录")
+    parser.add_argument('--profile', default=PROFILE,
+                        help="任务配置：profiles 目录下的名称或 yaml 文件路径（区域边界、变焦、解码规则、融合参数、默认权重）")
+    parser.add_argument('--weights', default=None,
+                        help="检测模型的 PyTorch 权重路径（导出模型在其旁边查找），默认使用任务配置中的权重")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help="输出目录（结果日志、startup.json、调试输出）")
+    parser.add_argument('--backend', choices=['auto', 'pt', 'onnx', 'int8', 'openvino', 'torchscript'], default=None,
+                        help="推理后端，默认使用任务配置中的后端；auto 表示存在通过 export_model.py / quantize_model.py 校验的导出模型时优先使用，否则使用 .pt")
+    parser.add_argument('--roi', choices=['each', 'union'], default=None,
+                        help="只对六个区域推理：each 为逐区域裁剪成批推理，union 为外接矩形推理；默认整帧推理")
+    parser.add_argument('--roi-imgsz', type=int, default=None, help="ROI 推理输入尺寸，默认 each 为 256、union 为 1280")
+    parser.add_argument('--engine', choices=['yolo', 'classifier'], default='yolo',
+                        help="识别引擎：yolo 为目标检测，classifier 为六区域批量分类")
+    parser.add_argument('--classifier-weights', default="/home/pi2/yolo_outcome/region_cls_stack.pt",
+                        help="区域分类器权重（由 region_classifier.py 训练得到）")
+    parser.add_argument('--fusion', action='store_true',
+                        help="启用置信度加权的时间融合：按区域投票输出融合结果，稳定后六个位置都发送稳定结果")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="启用自适应调度：结果收敛后降速直至暂停，区域帧差检测到场景变化时恢复全速")
+    parser.add_argument('--skip-unchanged', action='store_true',
+                        help="画面与上一次推理帧相比没有变化时跳过推理，复用上一次结果")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="随机补全的种子：缺失区域在并列最优结果中按种子和输入确定地选择；默认按固定优先级补全")
+    parser.add_argument('--decode-log', default=None,
+                        help="解码日志路径（JSON Lines），记录每次去重补全的输入与输出，可用 replay_decoder.py 重放")
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help="本机 HTTP 指标接口端口（GET http://127.0.0.1:<port>/metrics），0 为不启动")
+    parser.add_argument('--serial-heartbeat', type=float, default=SERIAL_HEARTBEAT,
+                        help="结果没有变化时的串口重发间隔（秒）；结果变化时立即发送")
+    parser.add_argument('--serial-protocol', type=int, choices=[0, 1], default=SERIAL_PROTOCOL,
+                        help="串口协议版本：0 为长字符串，1 为带序号、置信度和 CRC 的二进制帧")
+    parser.add_argument('--simulate', default=None,
+                        help="模拟模式：用视频文件或图片目录代替摄像头，串口改为 --sim-serial 指定的虚拟串口")
+    parser.add_argument('--sim-fps', type=float, default=15.0, help="模拟摄像头的帧率")
+    parser.add_argument('--sim-serial', choices=['memory', 'pty'], default='memory',
+                        help="模拟模式的串口：memory 为内存缓冲，pty 为伪终端（可用其他程序读取）")
+    parser.add_argument('--fast-start', action='store_true',
+                        help="启动优化：摄像头、模型、串口并行初始化，只尝试存在的摄像头设备；各启动节点的时刻写入 startup.json")
+    parser.add_argument('--zoom-mode', choices=['resize', 'crop'], default=None,
+                        help="数码变焦，默认使用任务配置中的 zoom_mode：resize 为裁剪后放大回采集尺寸，crop 为裁剪图直接送入 letterbox（少两次整帧重采样，不再纵向拉伸）")
+    parser.add_argument('--capture-size', type=parse_capture_size, default=CAPTURE_SIZE,
+                        help="请求的采集分辨率 宽x高；auto 为变焦裁剪后仍不低于推理尺寸的最小分辨率（纸垛为 1280x720）")
+    parser.add_argument('--mjpeg', action='store_true', help="请求 MJPEG 像素格式（摄像头端压缩，降低 USB 带宽）")
+    return parser.parse_args()
+
+
+def main(opt):
+    global result_queue, profile, completion_seed, decode_log, frame_encoder
+
+    profile = load_profile(opt.profile)
+    profile.zoom_mode = opt.zoom_mode or profile.zoom_mode
+
+    # 检测文件从 --yolov5-dir（默认为任务配置中的目录）导入；确保输出目录存在
+    opt.yolov5_dir = opt.yolov5_dir or profile.yolov5_dir
+    sys.path.insert(0, opt.yolov5_dir)
+    os.makedirs(opt.output_dir, exist_ok=True)
+
+    # 解码配置：随机补全种子与解码日志（可选，可用 replay_decoder.py 离线重放）
+    completion_seed = opt.seed
+    frame_encoder = FrameEncoder('stack', len(profile.region_bounds)) if opt.serial_protocol == 1 else None
+    if opt.decode_log:
+        decode_log = DecodeLog(opt.decode_log)
+
+    # 从结果日志恢复之前的结果（任务配置 output.journal 为 null 时不记录）
+    journal = None
+    if profile.journal:
+        journal = ResultJournal(
+            os.path.join(opt.output_dir, profile.journal), maxlen=result_queue.maxlen,
+            compact_every=RESULT_COMPACT_EVERY,
+        )
+    result_queue = deque(journal.load() if journal is not None else [], maxlen=result_queue.maxlen)
+
+    # 采集分辨率：auto 时按推理尺寸与变焦倍数选择（纸垛推理尺寸为 1280，即保持 1280×720）
+    capture_size = opt.capture_size
+    if capture_size == 'auto':
+        capture_size = zoom_capture_size(profile.imgsz, profile.zoom_factor, CAPTURE_SIZE)
+        print(f"采集分辨率: {capture_size[0]}x{capture_size[1]}")
 
-            # 运行YOLOv5检测
-            label_path = run_yolo_detection(image_path)
+    # 打开摄像头、加载模型、打开串口（模拟模式下使用虚拟串口）；--fast-start 时三者并行
+    timeline = StartupTimeline(os.path.join(opt.output_dir, "startup.json"))
 
-            # 获取检测结果字符串
-            result_str = get_detected_string(label_path, names) if label_path else "error"
+    def start_camera():
+        cap = open_camera(
+            opt.simulate, opt.sim_fps, opt.fast_start, capture_size, 'MJPG' if opt.mjpeg else CAPTURE_FOURCC,
+            opt.output_dir,
+        )
+        # 启动后台取帧线程，丢弃前几帧（纸垛为3帧）等待曝光稳定（与模型加载同时进行）
+        grabber = FrameGrabber(cap, settle_frames=profile.settle_frames).start()
+        timeline.mark('camera')
+        return cap, grabber
+
+    def start_models():
+        result = load_models(opt)
+        timeline.mark('model')
+        return result
+
+    def start_serial():
+        result = open_serial(opt.simulate, opt.sim_serial)
+        timeline.mark('serial')
+        return result
+
+    (cap, grabber), (detector, classifier), ser = run_startup_tasks(
+        [start_camera, start_models, start_serial], parallel=opt.fast_start
+    )
+
+    # 加载类别名称
+    names = load_class_names(opt.yolov5_dir)
+
+    debug_sink = None
+    if DEBUG_OUTPUT:
+        from detect import DebugSink
+        debug_sink = DebugSink(os.path.join(opt.output_dir, "detections"), names=names, slots=DEBUG_SLOTS)
+
+    # 启动串口发送线程：新结果发布后立即发送，不变时按心跳间隔重发（串口初始化失败时只保存结果）；记录第一个字节发出的时刻
+    publisher = ResultPublisher(
+        ser, heartbeat=opt.serial_heartbeat, min_interval=SERIAL_MIN_INTERVAL, tracker=metrics,
+        encode=encode_line if frame_encoder is None else bytes,
+        on_first_write=lambda: timeline.mark('first_serial_byte'),
+    ).start()
+
+    # 置信度加权的时间融合（可选）
+    voter = None
+    if opt.fusion:
+        voter = TemporalVoter(
+            profile.fusion_window, profile.fusion_min_frames, profile.fusion_min_share,
+            num_regions=len(profile.region_bounds),
+        )
+
+    # 自适应调度（可选）：场景变化时同时清空融合历史
+    scheduler = make_scheduler(profile.capture_interval, voter) if opt.adaptive else None
+
+    # 画面未变时跳过推理（可选）
+    scene_gate = None
+    if opt.skip_unchanged:
+        scene_gate = SceneChangeGate(profile.region_bounds, SCENE_CHANGE_THRESHOLD, SCENE_MAX_REUSE)
+
+    # 启动检测流水线（见 task_profile.py）：拍照间隔由配置的 capture_interval 控制，启用自适应调度时由调度器控制；
+    # 区域按归一化坐标划分，检测或解析失败的帧输出配置的 empty_result（"error"）
+    pipeline = profile.build_pipeline(
+        grabber, detector, (1, 1), metrics, completion_seed, scheduler, scene_gate,
+        names=names, debug_sink=debug_sink, classifier=classifier, roi=opt.roi, roi_pad=ROI_PAD, decode_log=decode_log,
+    ).start()
+    frame_count = 0
+
+    # 本机指标接口（可选）
+    metrics_server = None
+    if opt.metrics_port:
+        metrics_server = MetricsServer(
+            metrics, opt.metrics_port, extra=lambda: {'pipeline': pipeline.stats(), 'startup': timeline.snapshot()}
+        ).start()
+
+    try:
+        # 初始阶段：任务配置 output.wait_full 为 true 且结果队列不足6个时，拍摄照片直到有6个结果（期间不发送）
+        while profile.wait_full and len(result_queue) < 6:
+            print(f"初始阶段: 已有 {len(result_queue)} 个结果，需要至少6个")
+
+            # 从流水线取出下一帧的检测结果字符串
+            result_str, stable, region_votes = next_result(pipeline, voter, scheduler)
+            timeline.mark('first_result')  # 只记录第一次（恢复了6个结果时会跳过初始阶段）
             result_queue.append(result_str)
             print(f"新结果: {result_str}")
 
-            # 保存结果到文件
-            save_results_to_file()
+            # 追加到结果日志
+            if journal is not None:
+                journal.append(result_str)
+
+            # 融合结果稳定时，六个位置都发送稳定结果，不必等满6个结果
+            if stable:
+                current_long_string = '7'.join([result_str] * 6) + '7'
+                publisher.publish(serial_message(current_long_string, result_str, region_votes, stable))
+                print(f"初始长字符串（融合稳定）: {current_long_string}")
+                break
 
             # 更新长字符串（如果已有至少6个结果）
             if len(result_queue) >= 6:
@@ -445,36 +395,39 @@ def main():
                 # 确保所有元素都是字符串
                 recent_results = [str(x) for x in recent_results]
                 current_long_string = '7'.join(recent_results) + '7'
+                publisher.publish(serial_message(current_long_string, result_str, region_votes, stable))
                 print(f"初始长字符串: {current_long_string}")
 
-            time.sleep(0.5)
-
         # 持续拍摄和处理
         while True:
-            # 拍摄单张照片
-            image_path = capture_single_image(cap)
-
-            # 运行YOLOv5检测
-            label_path = run_yolo_detection(image_path)
-
-            # 获取检测结果字符串
-            result_str = get_detected_string(label_path, names) if label_path else "error"
+            # 从流水线取出下一帧的检测结果字符串
+            result_str, stable, region_votes = next_result(pipeline, voter, scheduler)
+            timeline.mark('first_result')
             result_queue.append(result_str)
             print(f"新结果: {result_str}")
 
-            # 保存结果到文件
-            save_results_to_file()
+            # 追加到结果日志
+            if journal is not None:
+                journal.append(result_str)
 
-            # 获取最近6个结果
-            recent_results = list(result_queue)[-6:]
+            # 获取最近6个结果（融合结果稳定时六个位置都发送稳定结果，wait_full 为 false 时不足6个也发送）
+            recent_results = [result_str] * 6 if stable else list(result_queue)[-6:]
             # 确保所有元素都是字符串
             recent_results = [str(x) for x in recent_results]
 
             # 形成新的长字符串
             current_long_string = '7'.join(recent_results) + '7'
+            publisher.publish(serial_message(current_long_string, result_str, region_votes, stable))
             print(f"更新长字符串: {current_long_string}")
 
-            time.sleep(0.5)  # 循环间隔
+            frame_count += 1
+            if frame_count % STATS_INTERVAL == 0:
+                print(f"流水线统计: {pipeline.stats_line()}")
+                print(f"延迟分位数 p50/p95/p99: {metrics.summary_line()}", flush=True)
+                if scheduler is not None:
+                    print(f"调度状态: {scheduler.state} 跳过帧数: {scheduler.skipped}")
+                if scene_gate is not None:
+                    print(f"画面未变跳过推理: {scene_gate.skipped}/{scene_gate.checked}")
 
     except KeyboardInterrupt:
         print("\n程序被用户中断")
@@ -485,13 +438,21 @@ def main():
         traceback.print_exc()
     finally:
         # 清理资源
-        serial_active = False
+        publisher.stop()
         if ser and ser.is_open:
             ser.close()
+        pipeline.stop()
+        grabber.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
         if cap and cap.isOpened():
             cap.release()
+        if decode_log is not None:
+            decode_log.close()
+        if journal is not None:
+            journal.close()
         print("资源已释放")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(parse_opt())
\ No newline at end of file
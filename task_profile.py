@@ -0,0 +1,265 @@
+import os
+from contextlib import nullcontext
+
+import cv2
+import numpy as np
+
+from constraint_decoder import DIGITS, LETTERS, build_table, decode
+from pipeline import Pipeline
+from region_assign import assign_regions
+
+# 内置任务配置目录：profiles/<名称>.yaml
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+PIPELINE_QUEUE_SIZE = 1
+PIPELINE_DROP_OLDEST = False
+
+
+class TaskProfile:
+    """由任务配置文件（见 profiles/box.yaml）描述的识别任务：模型、预处理、区域划分、约束解码、时间融合与串口输出
+
+    新的场地布局只需新增一个 yaml 文件，不必复制主程序；配置中的错误在加载时以 ValueError 报告
+    """
+
+    def __init__(self, config, path=None):
+        self.path = path
+        self.name = config['name']
+
+        model = config.get('model', {})
+        self.yolov5_dir = model['yolov5_dir']
+        self.weights = model['weights']
+        self.imgsz = int(model.get('imgsz', 640))
+        self.backend = model.get('backend', 'auto')
+
+        preprocess = config.get('preprocess', {})
+        self.settle_frames = int(preprocess.get('settle_frames', 10))
+        self.capture_interval = float(preprocess.get('capture_interval', 0.0))
+        self.zoom_factor = float(preprocess.get('zoom', 1.0))
+        self.zoom_center = tuple(preprocess.get('zoom_center', (0.5, 0.5)))
+        self.zoom_mode = preprocess.get('zoom_mode', 'resize')
+
+        regions = config['regions']
+        self.region_bounds = [tuple(float(v) for v in bounds) for bounds in regions['bounds']]
+        self.closed = bool(regions.get('closed', True))
+        self.exclusive = bool(regions.get('exclusive', False))
+        self.select = regions.get('select', 'leftmost')
+
+        decoder = config.get('decoder', {})
+        self.digits = str(decoder.get('digits', DIGITS))
+        self.position_priority = tuple(decoder.get('position_priority', range(len(self.region_bounds))))
+        letter_priority = decoder.get('letter_priority')
+        self.letter_priority = None if letter_priority is None else tuple(letter_priority)
+        self.empty_result = decoder.get('empty_result')
+
+        fusion = config.get('fusion', {})
+        self.fusion_window = int(fusion.get('window', 6))
+        self.fusion_min_frames = int(fusion.get('min_frames', 3))
+        self.fusion_min_share = float(fusion.get('min_share', 0.6))
+
+        output = config.get('output', {})
+        self.wait_full = bool(output.get('wait_full', False))
+        self.journal = output.get('journal')
+
+        self._validate()
+        self.table = build_table(self.position_priority, self.digits, self.letter_priority)
+
+    def _validate(self):
+        n = len(self.region_bounds)
+        if not 1 <= n <= len(LETTERS):
+            raise ValueError(f"{self.name}: 区域数量应为 1~{len(LETTERS)}，实际为 {n}")
+        for bounds in self.region_bounds:
+            if len(bounds) != 4 or not (bounds[0] < bounds[1] and bounds[2] < bounds[3]):
+                raise ValueError(f"{self.name}: 区域边界应为 (x_min, x_max, y_min, y_max)，实际为 {bounds}")
+        if self.zoom_mode not in ('resize', 'crop'):
+            raise ValueError(f"{self.name}: preprocess.zoom_mode 应为 resize 或 crop，实际为 {self.zoom_mode}")
+        if self.select not in ('leftmost', 'conf'):
+            raise ValueError(f"{self.name}: regions.select 应为 leftmost 或 conf，实际为 {self.select}")
+        if len(set(self.digits)) != len(self.digits) or not set(self.digits) <= set(DIGITS):
+            raise ValueError(f"{self.name}: decoder.digits 应为 {DIGITS} 中互不相同的数字，实际为 {self.digits}")
+        if sorted(self.position_priority) != list(range(n)):
+            raise ValueError(f"{self.name}: decoder.position_priority 应为 0~{n - 1} 的一个排列")
+        if self.letter_priority is not None and not set(self.letter_priority) <= set(range(n)):
+            raise ValueError(f"{self.name}: decoder.letter_priority 中的区域超出范围 0~{n - 1}")
+        digit_regions = n - (self.letter_priority is not None)
+        if len(self.digits) < digit_regions:
+            raise ValueError(f"{self.name}: {digit_regions} 个数字区域需要至少 {digit_regions} 个可用数字")
+
+    def zoom(self, frame):
+        """数码变焦：裁剪以 zoom_center 为中心的区域，zoom_mode 为 resize 时缩放回原尺寸，crop 时直接返回裁剪图（原帧的视图）
+
+        裁剪窗口超出画面的部分被截掉而不是平移回画面内（货箱截掉下边缘，纸垛 zoom 为 1 时截掉上下边缘），
+        区域边界是在这样的画面上标定的；截断后的裁剪图宽高比与原帧不同，resize 会把它纵向拉伸，crop 不拉伸
+        """
+        h, w = frame.shape[:2]
+        crop_w, crop_h = int(w / self.zoom_factor), int(h / self.zoom_factor)
+        x1 = max(0, int(w * self.zoom_center[0]) - crop_w // 2)
+        y1 = max(0, int(h * self.zoom_center[1]) - crop_h // 2)
+        cropped = frame[y1:min(h, y1 + crop_h), x1:min(w, x1 + crop_w)]
+        if self.zoom_mode == 'crop':
+            return cropped
+        return cv2.resize(cropped, (w, h), interpolation=cv2.INTER_LINEAR)
+
+    def region_char(self, region, char):
+        """区域识别结果的字符：有字母区域的任务中非数字、字母的类别视为该区域的字母，'x' 为未识别"""
+        char = str(char)
+        if self.letter_priority is not None and char != 'x' and char not in DIGITS + LETTERS:
+            return LETTERS[region]
+        return char
+
+    def assign(self, det, img_size=(1, 1)):
+        """按配置的区域边界与归入规则为每个区域选出一个对象，返回行号数组（区域内无对象为 -1）"""
+        return assign_regions(
+            det, self.region_bounds, img_size, closed=self.closed, exclusive=self.exclusive, select=self.select
+        )
+
+    def region_votes(self, det, names, img_size=(1, 1), tracker=None):
+        """按配置划分区域，返回每个区域的 (字符, 置信度)，区域内无对象时为 ('x', 0.0)"""
+        det = np.asarray(det).reshape(-1, 6)
+        det = det[(det[:, 5] >= 0) & (det[:, 5] < len(names))]
+        with timer(tracker, 'region'):
+            indexes = self.assign(det, img_size)
+        return [
+            (self.region_char(region, names[int(det[i, 5])]), float(det[i, 4])) if i >= 0 else ('x', 0.0)
+            for region, i in enumerate(indexes)
+        ]
+
+    def decode(self, region_chars, confs=None, seed=None, tracker=None, decode_log=None):
+        """约束解码：在配置生成的约束表中选出与识别结果一致的置信度总和最大的合法结果；decode_log 不为 None 时记录本次解码"""
+        with timer(tracker, 'decode'):
+            result = decode(region_chars, self.table, confs, seed)
+        if decode_log is not None:
+            decode_log.write(self.name, region_chars, confs, seed, result)
+        return result
+
+    def empty(self):
+        """检测失败时的输出 (empty_result, 各区域均未识别)"""
+        return self.empty_result, [('x', 0.0)] * len(self.region_bounds)
+
+    def parse(self, det, names, img_size=(1, 1), seed=None, tracker=None, decode_log=None):
+        """单帧检测数组 → (结果字符串, 各区域 (字符, 置信度))；det 为 None（检测失败）或为空时按 empty_result 输出"""
+        if det is None or not len(det):
+            if self.empty_result is not None:
+                return self.empty()
+            det = np.zeros((0, 6))
+        votes = self.region_votes(det, names, img_size, tracker)
+        chars, confs = zip(*votes)
+        return self.decode(chars, confs, seed, tracker, decode_log), votes
+
+    def parse_classified(self, region_chars, confs, seed=None, tracker=None, decode_log=None):
+        """区域分类器的结果（没有目标的区域为 'x'）→ 与 parse 相同格式的 (结果字符串, 各区域 (字符, 置信度))"""
+        votes = [(self.region_char(i, char), float(conf)) for i, (char, conf) in enumerate(zip(region_chars, confs))]
+        chars, confs = zip(*votes)
+        return self.decode(chars, confs, seed, tracker, decode_log), votes
+
+    def load_detector(self, backend=None, weights=None, imgsz=None):
+        """加载配置指定的检测模型；backend、weights、imgsz 不为 None 时覆盖配置中的值"""
+        from detect import Detector
+
+        imgsz = imgsz or self.imgsz
+        return Detector(weights=weights or self.weights, imgsz=(imgsz, imgsz), backend=backend or self.backend)
+
+    def build_pipeline(self, grabber, detector, img_size, tracker, seed=None, scheduler=None, scene_gate=None,
+                       names=None, debug_sink=None, classifier=None, roi=None, roi_pad=0.02, decode_log=None):
+        """构建 拍照/变焦/预处理 → 推理 → 区域解析 三级流水线，第 N+1 帧的拍摄与第 N 帧的推理并行
+
+        流水线输出 (结果字符串, 各区域 (字符, 置信度), 是否为新推理的结果)，各环节耗时记入 tracker；names 默认为检测模型的类别名。
+        classifier 不为 None 时用区域分类器（region_classifier.py）代替检测模型；
+        roi 为 'each' 或 'union' 时只对区域逐个裁剪或对其外接矩形推理（边距 roi_pad）；
+        scheduler 不为 None 时由自适应调度决定拍照间隔以及哪些帧需要推理；
+        scene_gate 不为 None 时画面未变的帧跳过预处理和推理，直接复用上一帧的解析结果（标记为非新结果，
+        调用方不应再计入时间融合与自适应调度）。
+        检测或解析失败时输出 empty_result，未配置 empty_result 时丢弃该帧
+        """
+        if names is None and detector is not None:
+            names = detector.names
+        last_parsed = [None]  # 上一次推理帧的解析结果
+
+        def capture_stage(_):
+            with timer(tracker, 'capture'):
+                ret, frame = grabber.read()
+            if not ret:
+                raise RuntimeError("摄像头读取失败")
+            with timer(tracker, 'zoom'):
+                frame = self.zoom(frame)
+            if scheduler is not None and not scheduler.should_infer(frame):
+                return None  # 结果已收敛且场景未变化，跳过该帧
+            if scene_gate is not None and not scene_gate.changed(frame):
+                return frame, None, False  # 画面未变，不做预处理
+            if roi or classifier is not None:
+                return frame, None, True  # ROI 在推理阶段裁剪、分类器自行裁剪区域，都不需要整帧预处理
+            with timer(tracker, 'preprocess'):
+                im = detector.preprocess(frame)
+            return frame, im, True
+
+        def detect_stage(item):
+            frame, im, fresh = item
+            if not fresh:
+                return frame, None, False
+            if classifier is not None:
+                with timer(tracker, 'inference'):
+                    return frame, classifier(frame), True
+            try:
+                if roi:
+                    det = detector.detect_rois(frame, self.region_bounds, pad=roi_pad, union=roi == 'union')
+                else:
+                    det = detector.forward(im, frame.shape)
+            except Exception as e:
+                if scene_gate is not None:
+                    scene_gate.reset()  # 检测失败的帧不作为参考帧，下一帧重新推理
+                if self.empty_result is None:
+                    raise
+                print(f"[{self.name}] 检测失败: {e}")
+                return frame, None, True
+            # Detector 的 Profile 记录了本次推理与 NMS 的耗时
+            if tracker is not None:
+                tracker.record('inference', detector.dt[1].dt)
+                tracker.record('nms', detector.dt[2].dt)
+            if debug_sink is not None:
+                debug_sink(frame, det)
+            return frame, det, True
+
+        def parse_stage(item):
+            _, result, fresh = item
+            if not fresh:
+                # 复用上一次推理帧的结果；参考帧推理失败时还没有结果，返回 None 丢弃该帧
+                return None if last_parsed[0] is None else (*last_parsed[0], False)
+            try:
+                if classifier is not None and result is not None:
+                    parsed = self.parse_classified(*result, seed, tracker, decode_log)
+                else:
+                    parsed = self.parse(result, names, img_size, seed, tracker, decode_log)
+            except Exception as e:
+                if self.empty_result is None:
+                    raise
+                print(f"[{self.name}] 处理识别结果失败: {e}")
+                parsed = self.empty()
+            last_parsed[0] = parsed
+            return (*parsed, True)
+
+        pipeline = Pipeline(
+            maxsize=PIPELINE_QUEUE_SIZE,
+            drop_oldest=PIPELINE_DROP_OLDEST,
+            source_interval=scheduler.interval if scheduler is not None else self.capture_interval,
+        )
+        pipeline.add_stage("capture", capture_stage)
+        pipeline.add_stage("detect", detect_stage)
+        pipeline.add_stage("parse", parse_stage)
+        return pipeline
+
+
+def timer(tracker, name):
+    """tracker 不为 None 时记录代码块耗时"""
+    return tracker.timer(name) if tracker is not None else nullcontext()
+
+
+def load_profile(name_or_path):
+    """加载任务配置：内置名称（profiles 目录下的 box、stack）或 yaml 文件路径"""
+    import yaml
+
+    path = name_or_path
+    if not os.path.exists(path):
+        path = os.path.join(PROFILE_DIR, f"{name_or_path}.yaml")
+    with open(path, encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    return TaskProfile(config, path)
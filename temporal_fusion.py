@@ -0,0 +1,69 @@
+import threading
+from collections import deque
+
+
+class TemporalVoter:
+    """时间融合：在最近 window 帧内对每个区域按置信度加权投票，输出融合后的六个字符与稳定标志
+
+    每帧输入六个区域的 (字符, 置信度)，没有识别到的区域为 None 或字符为 'x'（不参与投票）；
+    reset() 可由其他线程调用（如拍照阶段的自适应调度检测到场景变化时），与 update() 等由锁互斥
+    """
+
+    def __init__(self, window=6, min_frames=3, min_share=0.6, decay=1.0, num_regions=6):
+        self.window = window
+        self.min_frames = min_frames  # 至少累计这么多帧才可能判定稳定
+        self.min_share = min_share  # 每个区域获胜字符的加权票数占比都达到该值才判定稳定
+        self.decay = decay  # 越旧的帧权重越低：第 k 旧的帧权重乘以 decay**k
+        self.num_regions = num_regions
+        self.history = deque(maxlen=window)
+        self._lock = threading.RLock()
+
+    def reset(self):
+        """场景变化（如机器人移动）后清空历史"""
+        with self._lock:
+            self.history.clear()
+
+    def update(self, region_votes):
+        """加入一帧的六个区域结果，返回 result()"""
+        with self._lock:
+            self.history.append(list(region_votes))
+            return self.result()
+
+    def scores(self):
+        """返回每个区域的 {字符: 加权票数}"""
+        with self._lock:
+            history = list(self.history)
+        scores = [{} for _ in range(self.num_regions)]
+        weight = 1.0
+        for frame_votes in reversed(history):
+            for i, vote in enumerate(frame_votes):
+                if vote is None or vote[0] == 'x':
+                    continue
+                char, conf = vote
+                scores[i][char] = scores[i].get(char, 0.0) + conf * weight
+            weight *= self.decay
+        return scores
+
+    def result(self):
+        """返回 (融合字符列表, 每个区域的融合置信度, 是否稳定)
+
+        没有任何票的区域字符为 'x'、置信度为 0；融合置信度为获胜字符的平均每帧加权票数（0~1）
+        """
+        with self._lock:
+            frames = len(self.history)
+            region_scores_list = self.scores()
+        chars, confs = [], []
+        stable = frames >= self.min_frames
+        frames = max(frames, 1)
+        for region_scores in region_scores_list:
+            if not region_scores:
+                chars.append('x')
+                confs.append(0.0)
+                stable = False
+                continue
+            char, score = max(region_scores.items(), key=lambda item: (item[1], item[0]))
+            chars.append(char)
+            confs.append(min(score / frames, 1.0))
+            if score / sum(region_scores.values()) < self.min_share:
+                stable = False
+        return chars, confs, stable
@@ -0,0 +1,107 @@
+import os
+import subprocess
+import sys
+from itertools import product
+
+import pytest
+
+from constraint_decoder import (
+    ALPHABET, BOX_TABLE, DIGITS, LETTER, LETTERS, STACK_LETTER_PRIORITY, STACK_TABLE, decode_box, decode_stack,
+)
+
+
+def table_strings(table):
+    """约束表的每一行 → 结果字符串（字母为其所在区域对应的字母）"""
+    return [''.join(LETTERS[i] if ALPHABET[c] == LETTER else ALPHABET[c] for i, c in enumerate(row)) for row in table]
+
+
+def is_valid_stack(result):
+    letters = [i for i, c in enumerate(result) if c in LETTERS]
+    digits = [c for c in result if c in DIGITS]
+    return (len(result) == 6 and len(letters) == 1 and result[letters[0]] == LETTERS[letters[0]]
+            and len(set(digits)) == 5)
+
+
+def test_box_all_inputs():
+    # 7^6 种输入（每个区域为 1~6 或未识别）：输出总是 1~6 的排列，只出现一次的数字留在原区域，
+    # 每个识别到的数字都保留在它的某个区域上（置信度相同时能保留的识别结果都保留）
+    for chars in product(DIGITS + 'x', repeat=6):
+        result = decode_box(chars)
+        assert sorted(result) == list(DIGITS), (chars, result)
+        for i, char in enumerate(chars):
+            if char != 'x' and chars.count(char) == 1:
+                assert result[i] == char, (chars, result)
+        for char in set(chars) - {'x'}:
+            assert any(result[i] == char for i in range(6) if chars[i] == char), (chars, result)
+
+
+def test_box_valid_inputs_unchanged():
+    for result in table_strings(BOX_TABLE):
+        assert decode_box(list(result)) == result
+
+
+def test_stack_valid_layouts_unchanged():
+    layouts = table_strings(STACK_TABLE)
+    assert len(set(layouts)) == 6 * 720
+    for result in layouts:
+        assert is_valid_stack(result)
+        assert decode_stack(list(result)) == result
+        assert decode_stack(list(result), [0.5] * 6, seed=3) == result
+
+
+def test_stack_outputs_always_valid():
+    for chars in product('1a6x', repeat=6):
+        assert is_valid_stack(decode_stack(chars)), chars
+
+
+@pytest.mark.parametrize('decoder', [decode_box, decode_stack])
+def test_duplicates_resolved_by_confidence(decoder):
+    chars = ['3', 'x', 'x', 'x', '3', 'x']
+    assert decoder(chars, [0.9, 0, 0, 0, 0.4, 0])[0] == '3'
+    assert decoder(chars, [0.4, 0, 0, 0, 0.9, 0])[4] == '3'
+
+
+def test_stack_letter_resolved_by_confidence():
+    # 两个区域都识别为字母时，置信度高的区域保留字母，另一个区域补数字
+    result = decode_stack(['a', 'b', '1', '2', '3', '4'], [0.3, 0.8, 0.9, 0.9, 0.9, 0.9])
+    assert result[1] == 'b' and result[0] in DIGITS
+
+
+def test_box_ties_follow_priority():
+    assert decode_box(['x'] * 6) == '123456'
+    assert decode_box(['x', 'x', 'x', 'x', 'x', '1']) == '234561'
+
+
+def test_stack_ties_follow_priority():
+    # 没有识别到字母时字母放在 STACK_LETTER_PRIORITY 的第一个区域，
+    # 缺失的数字按 STACK_POSITION_PRIORITY 的区域顺序依次使用 STACK_DIGIT_PRIORITY 中的数字
+    result = decode_stack(['x'] * 6)
+    assert result[STACK_LETTER_PRIORITY[0]] == LETTERS[STACK_LETTER_PRIORITY[0]]
+    assert result == '4b5126'
+    assert decode_stack(['a', 'x', 'x', 'x', 'x', 'x']) == 'a65124'
+    # 字母优先的区域已有数字时，字母放在下一个优先的区域
+    assert decode_stack(['x', '3', 'x', 'x', 'x', 'x'])[STACK_LETTER_PRIORITY[1]] == LETTERS[STACK_LETTER_PRIORITY[1]]
+
+
+@pytest.mark.parametrize('decoder', [decode_box, decode_stack])
+def test_seed_reproducible(decoder):
+    chars = ['x', '2', 'x', 'x', '5', 'x']
+    confs = [0, 0.7, 0, 0, 0.6, 0]
+    for seed in range(20):
+        assert decoder(chars, confs, seed) == decoder(chars, confs, seed)
+    # 不同种子在并列结果中选择不同的补全，且都保留识别到的数字
+    results = {decoder(chars, confs, seed) for seed in range(20)}
+    assert len(results) > 1
+    assert all(r[1] == '2' and r[4] == '5' for r in results)
+
+
+def test_seed_reproducible_across_processes():
+    # 补全键不依赖 Python 的 hash 随机化，不同进程得到同样的结果
+    code = "from constraint_decoder import decode_stack; print(decode_stack(['x'] * 6, None, 7))"
+    outputs = set()
+    for hash_seed in ('0', '1', '2'):
+        env = {**os.environ, 'PYTHONHASHSEED': hash_seed}
+        proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, env=env,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+        outputs.add(proc.stdout.strip())
+    assert outputs == {decode_stack(['x'] * 6, None, 7)}